@@ -1,5 +1,6 @@
 // app/api/emails.ts
 import { apiClient } from './client';
+import { API_CONFIG } from './config';
 import type { User } from './types';
 
 export interface EmailResponse {
@@ -18,6 +19,7 @@ export interface EmailResponse {
     status: 'pending' | 'processed' | 'failed';
     is_read: boolean;
     processed_at?: string;
+    created_at?: string;
 }
 
 export interface EmailInboxResponse {
@@ -44,6 +46,11 @@ export interface EmailProcessResponse {
     processing_time: number;
 }
 
+export type EmailEvent =
+    | { type: 'email.created'; email: EmailResponse }
+    | { type: 'email.updated'; email: Partial<EmailResponse> & { $id: string } }
+    | { type: 'resync' };
+
 export interface DashboardStats {
     totalEmails: number;
     unreadCount: number;
@@ -135,23 +142,7 @@ export class EmailService {
     async getDashboardStats(userId: string): Promise<DashboardStats> {
         try {
         const inboxResponse = await this.getInbox(userId, 1000);
-        const emails = inboxResponse.emails;
-        
-        const totalEmails = emails.length;
-        const unreadCount = inboxResponse.unread_count;
-        const productiveEmails = emails.filter(e => e.category === 'produtivo').length;
-        const unproductiveEmails = emails.filter(e => e.category === 'improdutivo').length;
-        
-        const processedEmails = emails.filter(e => e.status === 'processed').length;
-        const processingAccuracy = totalEmails > 0 ? (processedEmails / totalEmails) * 100 : 0;
-
-        return {
-            totalEmails,
-            unreadCount,
-            productiveEmails,
-            unproductiveEmails,
-            processingAccuracy: Math.round(processingAccuracy * 10) / 10 // 1 casa decimal
-        };
+        return computeDashboardStats(inboxResponse.emails);
         } catch (error) {
         console.error('Erro ao calcular estatísticas:', error);
         return {
@@ -163,6 +154,67 @@ export class EmailService {
         };
         }
     }
+
+    // Push de emails novos e mudanças de status (SSE). Retorna a função que fecha a conexão.
+    subscribeToEvents(userId: string, onEvent: (event: EmailEvent) => void): () => void {
+        const source = new EventSource(`${API_CONFIG.baseURL}/emails/events/${userId}`);
+        let connected = false;
+
+        source.addEventListener('email.created', (e) => {
+        onEvent({ type: 'email.created', email: JSON.parse((e as MessageEvent).data) });
+        });
+        source.addEventListener('email.updated', (e) => {
+        onEvent({ type: 'email.updated', email: JSON.parse((e as MessageEvent).data) });
+        });
+        source.addEventListener('resync', () => onEvent({ type: 'resync' }));
+
+        // Eventos perdidos enquanto a conexão caiu são recuperados com um novo fetch
+        source.onopen = () => {
+        if (connected) onEvent({ type: 'resync' });
+        connected = true;
+        };
+
+        return () => source.close();
+    }
+}
+
+// Data do email: created_at guarda a original (ex.: header Date de uma caixa importada), em UTC
+export function emailDate(email: Pick<EmailResponse, '$createdAt' | 'created_at'>): string {
+    const date = email.created_at;
+    if (!date) return email.$createdAt;
+    return /(Z|[+-]\d\d:?\d\d)$/i.test(date) ? date : `${date}Z`;
+}
+
+export function computeDashboardStats(emails: EmailResponse[]): DashboardStats {
+    const totalEmails = emails.length;
+    const unreadCount = emails.filter(e => !e.is_read).length;
+    const productiveEmails = emails.filter(e => e.category === 'produtivo').length;
+    const unproductiveEmails = emails.filter(e => e.category === 'improdutivo').length;
+
+    const processedEmails = emails.filter(e => e.status === 'processed').length;
+    const processingAccuracy = totalEmails > 0 ? (processedEmails / totalEmails) * 100 : 0;
+
+    return {
+        totalEmails,
+        unreadCount,
+        productiveEmails,
+        unproductiveEmails,
+        processingAccuracy: Math.round(processingAccuracy * 10) / 10 // 1 casa decimal
+    };
+}
+
+// Aplica um evento à caixa de entrada do usuário (emails novos entram no topo)
+export function applyEmailEvent(emails: EmailResponse[], event: EmailEvent, userId: string): EmailResponse[] {
+    if (event.type === 'email.created') {
+        if (event.email.recipient_user_id !== userId || emails.some(e => e.$id === event.email.$id)) {
+        return emails;
+        }
+        return [event.email, ...emails];
+    }
+    if (event.type === 'email.updated') {
+        return emails.map(e => e.$id === event.email.$id ? { ...e, ...event.email } : e);
+    }
+    return emails;
 }
 
 export const emailService = new EmailService();
\ No newline at end of file
@@ -1,24 +1,28 @@
 import { useState, useEffect } from "react";
 import { Link } from "react-router";
 import { useAuth } from "~/api/authContext";
-import { emailService, type DashboardStats, type EmailResponse } from "~/api/emails";
+import { applyEmailEvent, computeDashboardStats, emailDate, emailService, type EmailResponse } from "~/api/emails";
 
 export default function Dashboard() {
   const { state } = useAuth();
-  const [stats, setStats] = useState<DashboardStats>({
-    totalEmails: 0,
-    unreadCount: 0,
-    productiveEmails: 0,
-    unproductiveEmails: 0,
-    processingAccuracy: 0
-  });
-  const [recentEmails, setRecentEmails] = useState<EmailResponse[]>([]);
+  const [emails, setEmails] = useState<EmailResponse[]>([]);
   const [isLoading, setIsLoading] = useState(true);
+  // Estatísticas e recentes saem da mesma caixa, atualizada pelos eventos SSE
+  const stats = computeDashboardStats(emails);
+  const recentEmails = emails.slice(0, 5);
 
   useEffect(() => {
-    if (state.user) {
-      fetchDashboardData();
-    }
+    if (!state.user) return;
+    const userId = state.user.$id;
+
+    fetchDashboardData();
+    return emailService.subscribeToEvents(userId, (event) => {
+      if (event.type === 'resync') {
+        fetchDashboardData();
+      } else {
+        setEmails(prev => applyEmailEvent(prev, event, userId));
+      }
+    });
   }, [state.user]);
 
   const fetchDashboardData = async () => {
@@ -29,13 +33,9 @@ export default function Dashboard() {
     setIsLoading(true);
     
     try {
-      // Buscar estatísticas
-      const dashboardStats = await emailService.getDashboardStats(state.user.$id);
-      setStats(dashboardStats);
-
-      // Buscar emails recentes
-      const inbox = await emailService.getInbox(state.user.$id, 5);
-      setRecentEmails(inbox.emails);
+      // Uma leitura só: estatísticas e emails recentes são calculados a partir dela
+      const inbox = await emailService.getInbox(state.user.$id, 1000);
+      setEmails(inbox.emails);
     } catch (error) {
       console.error('Erro ao buscar dados do dashboard:', error);
     } finally {
@@ -207,7 +207,7 @@ export default function Dashboard() {
                       {email.subject}
                     </p>
                     <p className="text-sm text-gray-500 dark:text-gray-400">
-                      De: {email.sender} • {formatDate(email.$createdAt)}
+                      De: {email.sender} • {formatDate(emailDate(email))}
                     </p>
                   </div>
                   <span className={`inline-flex items-center px-2.5 py-0.5 rounded-full text-xs font-medium ${
@@ -1,7 +1,7 @@
 import { useEffect, useState } from "react";
 import { Link, useLocation, useNavigate } from "react-router";
 import { useAuth } from "~/api/authContext";
-import {emailService, type EmailResponse } from "~/api/emails";
+import {emailDate, emailService, type EmailResponse } from "~/api/emails";
 
 interface ComposeState {
     replyTo?: EmailResponse;
@@ -34,7 +34,7 @@ export default function EmailCompose() {
             setFormData({
                 recipient: composeState.replyTo.sender,
                 subject: composeState.subject || `Re: ${composeState.replyTo.subject}`,
-                body: composeState.prefillBody || `\n\n--- Original Message ---\nFrom: ${composeState.replyTo.sender}\nContent: ${composeState.replyTo.subject}\nData: ${new Date(composeState.replyTo.$createdAt).toLocaleString('pt-BR')}\n\n${composeState.replyTo.body}`,
+                body: composeState.prefillBody || `\n\n--- Original Message ---\nFrom: ${composeState.replyTo.sender}\nContent: ${composeState.replyTo.subject}\nData: ${new Date(emailDate(composeState.replyTo)).toLocaleString('pt-BR')}\n\n${composeState.replyTo.body}`,
             });
         }
     }, [composeState]);
@@ -158,7 +158,7 @@ export default function EmailCompose() {
             <div className="text-sm text-blue-700 dark:text-blue-300">
                 <p><strong>De:</strong> {composeState.replyTo.sender}</p>
                 <p><strong>Assunto:</strong> {composeState.replyTo.subject}</p>
-                <p><strong>Data:</strong> {new Date(composeState.replyTo.$createdAt).toLocaleDateString('pt-BR', {
+                <p><strong>Data:</strong> {new Date(emailDate(composeState.replyTo)).toLocaleDateString('pt-BR', {
                 weekday: 'long', year: 'numeric', month: 'long', day: 'numeric', hour: '2-digit', minute: '2-digit'
                 })}</p>
             </div>
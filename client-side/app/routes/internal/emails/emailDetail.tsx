@@ -1,7 +1,7 @@
 import { useState, useEffect } from "react";
 import { useParams, Link, useNavigate } from "react-router";
 import { useAuth } from "../../../api/authContext";
-import { emailService, type EmailResponse } from "../../../api/emails";
+import { emailDate, emailService, type EmailResponse } from "../../../api/emails";
 
 export default function EmailDetail() {
     const { emailId } = useParams<{ emailId: string }>();
@@ -156,7 +156,7 @@ export default function EmailDetail() {
                         Data:
                     </span>
                     <span className="text-sm text-gray-900 dark:text-white">
-                        {formatDate(email.$createdAt)}
+                        {formatDate(emailDate(email))}
                     </span>
                     </div>
                 </div>
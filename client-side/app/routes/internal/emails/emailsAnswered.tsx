@@ -1,7 +1,7 @@
 import { useState, useEffect } from "react";
 import { Link } from "react-router";
 import { useAuth } from "../../../api/authContext";
-import { emailService, type EmailResponse } from "../../../api/emails";
+import { emailDate, emailService, type EmailResponse } from "../../../api/emails";
 
 export default function EmailsAnswered() {
     const { state } = useAuth();
@@ -125,7 +125,7 @@ export default function EmailsAnswered() {
                             {email.category === 'produtivo' ? '✅' : '⚠️'} {email.category}
                         </span>
                         <p className="text-sm text-gray-500 dark:text-gray-400">
-                            {formatDate(email.$createdAt)}
+                            {formatDate(emailDate(email))}
                         </p>
                         </div>
                     </div>
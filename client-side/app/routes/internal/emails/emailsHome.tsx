@@ -1,7 +1,7 @@
 import { useState, useEffect } from "react";
 import { Link, useNavigate } from "react-router";
 import { useAuth } from "../../../api/authContext";
-import { emailService, type EmailResponse } from "../../../api/emails";
+import { applyEmailEvent, emailDate, emailService, type EmailResponse } from "../../../api/emails";
 
 export default function EmailsHome() {
     const { state } = useAuth();
@@ -10,13 +10,22 @@ export default function EmailsHome() {
     const [isLoading, setIsLoading] = useState(true);
     const [error, setError] = useState('');
     const [filter, setFilter] = useState<'all' | 'unread' | 'produtivo' | 'improdutivo'>('all');
-    const [unreadCount, setUnreadCount] = useState(0);
+    const unreadCount = emails.filter(email => !email.is_read).length;
 
+    // Busca a caixa uma vez; depois aplica os deltas recebidos por SSE (o filtro é só local)
     useEffect(() => {
-        if (state.user) {
+        if (!state.user) return;
+        const userId = state.user.$id;
+
         fetchEmails();
+        return emailService.subscribeToEvents(userId, (event) => {
+        if (event.type === 'resync') {
+            fetchEmails();
+        } else {
+            setEmails(prev => applyEmailEvent(prev, event, userId));
         }
-    }, [state.user, filter]);
+        });
+    }, [state.user]);
 
     const fetchEmails = async () => {
         if (!state.user) return;
@@ -27,7 +36,6 @@ export default function EmailsHome() {
         try {
         const response = await emailService.getInbox(state.user.$id);
         setEmails(response.emails);
-        setUnreadCount(response.unread_count);
         } catch (err) {
         setError('Erro ao carregar emails');
         console.error('Erro ao buscar emails:', err);
@@ -43,7 +51,6 @@ export default function EmailsHome() {
             setEmails(prev => prev.map(e => 
             e.$id === email.$id ? { ...e, is_read: true } : e
             ));
-            setUnreadCount(prev => Math.max(0, prev - 1));
         } catch (error) {
             console.error('Erro ao marcar como lido:', error);
         }
@@ -182,7 +189,7 @@ export default function EmailsHome() {
                             {email.category === 'produtivo' ? '✅' : '⚠️'} {email.category}
                         </span>
                         <p className="text-sm text-gray-500 dark:text-gray-400">
-                            {formatDate(email.$createdAt)}
+                            {formatDate(emailDate(email))}
                         </p>
                         </div>
                     </div>
@@ -0,0 +1,106 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+
+from ...dependencies import require_admin
+from ...services.classifier_head import classifier_head
+from ...services.email_ai_service import email_ai_service
+from ...services.reclassification_service import reclassification_job
+from ...services.resource_governor import resource_governor
+from ...services.admission_control import admission_controller
+from ...services.request_profiler import request_profiler
+from ...services.email_replica import email_replica
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.post("/admin/reclassify", status_code=status.HTTP_202_ACCEPTED)
+async def start_reclassification(resume: bool = True):
+    if not email_ai_service.has_models:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Models are not loaded in this process; run reclassify.py next to the models instead"
+        )
+    if not reclassification_job.start(resume=resume):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Reclassification already running")
+    return reclassification_job.status()
+
+@router.get("/admin/reclassify")
+async def get_reclassification_status():
+    return reclassification_job.status()
+
+@router.delete("/admin/reclassify")
+async def cancel_reclassification():
+    reclassification_job.cancel()
+    return reclassification_job.status()
+
+@router.get("/admin/classifier-head")
+async def get_classifier_head():
+    return {
+        "available": classifier_head.available,
+        "version": classifier_head.version,
+        "model_version": email_ai_service.model_version,
+    }
+
+@router.post("/admin/classifier-head/reload")
+async def reload_classifier_head():
+    classifier_head.reload()
+    return await get_classifier_head()
+
+@router.get("/admin/resources")
+async def get_resources():
+    return {
+        **resource_governor.report(),
+        "models_loaded": email_ai_service.models_loaded,
+        "idle_seconds": round(email_ai_service.idle_seconds(), 1),
+        "admission": admission_controller.status(),
+    }
+
+@router.post("/admin/resources/unload")
+async def unload_models():
+    if not email_ai_service.unload_models():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Models are not loaded or are in use")
+    return await get_resources()
+
+@router.get("/admin/replica")
+async def get_replica():
+    return email_replica.status()
+
+@router.get("/admin/profiling")
+async def get_profiling():
+    return request_profiler.status()
+
+@router.put("/admin/profiling")
+async def configure_profiling(
+    sample_rate: Optional[float] = None,
+    mode: Optional[str] = None,
+    trace_memory: Optional[bool] = None,
+    path_prefix: Optional[str] = None
+):
+    try:
+        request_profiler.configure(sample_rate=sample_rate, mode=mode, trace_memory=trace_memory, path_prefix=path_prefix)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return request_profiler.status()
+
+@router.delete("/admin/profiling")
+async def clear_profiles():
+    request_profiler.clear()
+    return request_profiler.status()
+
+@router.get("/admin/profiling/{profile_id}")
+async def download_profile(profile_id: str, format: str = "collapsed"):
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    if format not in profile.artifacts:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Format {format} not available for this profile; available: {', '.join(sorted(profile.artifacts))}"
+        )
+    if format == "pstats":
+        return Response(
+            content=profile.artifacts[format],
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.pstats"'},
+        )
+    return Response(content=profile.artifacts[format], media_type="text/plain; charset=utf-8")
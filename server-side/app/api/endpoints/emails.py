@@ -1,4 +1,7 @@
-from fastapi import APIRouter, HTTPException, status
+import asyncio
+from fastapi import APIRouter, File, HTTPException, Query as QueryParam, Request, UploadFile, status
+from fastapi.responses import StreamingResponse
+from itertools import chain
 from typing import List, Optional
 from datetime import datetime
 from appwrite.query import Query
@@ -6,123 +9,164 @@ from appwrite.query import Query
 from ...models.email import (
     EmailCreate, EmailUpdate, EmailResponse, EmailSendRequest,
     EmailProcessRequest, EmailProcessResponse, EmailStatus, 
-    EmailCategory, EmailInboxResponse
+    EmailCategory, EmailInboxResponse, EmailExportFormat, EmailMailbox, EmailSearchHit, CategorySource
+)
+from ..responses import (
+    conditional_json_response, fast_json_response, project_document, serialize_documents, versioned_json_response
 )
 from ...services.appwrite_service import appwrite_service
-from ...services.email_ai_service import email_ai_service
+from ...services.inference_service import inference_service
 from ...services.email_user_service import email_user_service
+from ...services.email_export_service import email_export_service
+from ...services.vector_index import vector_index
+from ...services.admission_control import admission_controller
+from ...services.event_bus import event_bus
+from ...services.mailbox_versions import documents_etag
+from ...services.email_replica import email_replica
+from ...services.email_ai_service import email_ai_service
+from ...services.appwrite_user_service import appwrite_user_service
+from ...services.mailbox_import_service import MailboxImportJob, mailbox_import_service, save_upload
 from ...config import settings
 
 router = APIRouter()
 
+def _admission_key(request: Request) -> str:
+    # Sem autenticação, um user_id vindo do cliente é trocável a cada requisição: o limite vale por IP
+    return request.client.host if request.client else "anonymous"
+
 @router.post("/emails/send", response_model=EmailResponse, status_code=status.HTTP_201_CREATED)
 async def send_email(
     sender_user_id: str,
     email_request: EmailSendRequest
 ) -> EmailResponse:
-    try:
-        result = await email_user_service.send_email(
-            sender_user_id=sender_user_id,
-            recipient_email=email_request.recipient_email,
-            subject=email_request.subject,
-            body=email_request.body
-        )
-        return EmailResponse(**result)
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    async with admission_controller.admit(sender_user_id):
+        try:
+            result = await email_user_service.send_email(
+                sender_user_id=sender_user_id,
+                recipient_email=email_request.recipient_email,
+                subject=email_request.subject,
+                body=email_request.body
+            )
+            return EmailResponse(**result)
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
 @router.get("/emails/inbox/{user_id}", response_model=EmailInboxResponse)  # ✅ Adicione o @ que está faltando
 async def get_user_inbox(
+    request: Request,
     user_id: str,
     limit: int = 50,
     include_read: bool = True
 ) -> EmailInboxResponse:
     try:
-        result = email_user_service.get_user_inbox(
-            user_id=user_id,
-            limit=limit,
-            include_read=include_read
-        )
-        emails = [EmailResponse(**email) for email in result['emails']]
-        return EmailInboxResponse(
-            total=result['total'],
-            unread_count=result['unread_count'],
-            emails=emails
+        return await versioned_json_response(
+            request,
+            key=user_id,
+            params=("inbox", limit, include_read),
+            load=lambda: email_user_service.get_user_inbox(
+                user_id=user_id,
+                limit=limit,
+                include_read=include_read
+            ),
+            documents=lambda result: result['emails'],
+            render=lambda result: {
+                "total": result['total'],
+                "unread_count": result['unread_count'],
+                "emails": serialize_documents(EmailResponse, result['emails'])
+            }
         )
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @router.get("/emails/sent/{user_id}", response_model=List[EmailResponse])
-async def get_user_sent(user_id: str, limit: int = 50) -> List[EmailResponse]:
+async def get_user_sent(request: Request, user_id: str, limit: int = 50) -> List[EmailResponse]:
     try:
-        result = email_user_service.get_user_sent(
-            user_id=user_id,
-            limit=limit
+        return await versioned_json_response(
+            request,
+            key=user_id,
+            params=("sent", limit),
+            load=lambda: email_user_service.get_user_sent(
+                user_id=user_id,
+                limit=limit
+            ),
+            documents=lambda result: result,
+            render=lambda result: serialize_documents(EmailResponse, result)
         )
-        return [EmailResponse(**email) for email in result]
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
 @router.patch("/emails/{email_id}/read")
 async def mark_email_as_read(email_id: str, user_id: str):
     try:
-        email_user_service.mark_as_read(email_id=email_id, user_id=user_id)  # ✅ Corrigido: era mark_email_as_read
+        await email_user_service.mark_as_read(email_id=email_id, user_id=user_id)  # ✅ Corrigido: era mark_email_as_read
         return {"message": "Email marked as read"}
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
 @router.get("/emails/conversation/{user1_id}/{user2_id}", response_model=List[EmailResponse])
-async def get_conversation(user1_id: str, user2_id: str, limit: int = 50) -> List[EmailResponse]:
+async def get_conversation(request: Request, user1_id: str, user2_id: str, limit: int = 50) -> List[EmailResponse]:
     try:
-        result = email_user_service.get_conversation(
-            user1_id=user1_id,
-            user2_id=user2_id,
-            limit=limit
+        # Todo email da conversa envolve user1, então a versão da caixa dele basta
+        return await versioned_json_response(
+            request,
+            key=user1_id,
+            params=("conversation", user2_id, limit),
+            load=lambda: email_user_service.get_conversation(
+                user1_id=user1_id,
+                user2_id=user2_id,
+                limit=limit
+            ),
+            documents=lambda result: result,
+            render=lambda result: serialize_documents(EmailResponse, result)
         )
-        return [EmailResponse(**email) for email in result]
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @router.post("/emails/process-text", response_model=EmailProcessResponse)
-async def process_email_text(request: EmailProcessRequest) -> EmailProcessResponse:
-    try:
-        result = await email_ai_service.process_email(
-            content=request.text_content,
-            subject=request.subject or ""
-        )
-        return EmailProcessResponse(**result)
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+async def process_email_text(request: EmailProcessRequest, http_request: Request) -> EmailProcessResponse:
+    async with admission_controller.admit(_admission_key(http_request)):
+        try:
+            result = await inference_service.process_email(
+                content=request.text_content,
+                subject=request.subject or ""
+            )
+            return EmailProcessResponse(**result)
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @router.post("/emails", response_model=EmailResponse, status_code=status.HTTP_201_CREATED)
 async def create_and_process_email(email: EmailCreate) -> EmailResponse:
-    try:
-        # Processa com IA
-        ai_result = await email_ai_service.process_email(
-            content=email.body,
-            subject=email.subject
-        )
+    async with admission_controller.admit(email.sender_user_id):
+        try:
+            # Processa com IA
+            ai_result = await inference_service.process_email(
+                content=email.body,
+                subject=email.subject
+            )
         
-        email_data = email.model_dump()
-        now = datetime.utcnow()
-        email_data.update({
-            "category": ai_result["category"],
-            "confidence_score": ai_result["confidence_score"],
-            "suggested_response": ai_result["suggested_response"],
-            "status": EmailStatus.PROCESSED,
-            "processed_at": now.isoformat(),
-            "created_at": now.isoformat(),
-            "updated_at": now.isoformat()
-        })
+            email_data = email.model_dump()
+            now = datetime.utcnow()
+            email_data.update({
+                "category": ai_result["category"],
+                "confidence_score": ai_result["confidence_score"],
+                "suggested_response": ai_result["suggested_response"],
+                "model_version": ai_result["model_version"],
+                "status": EmailStatus.PROCESSED,
+                "processed_at": now.isoformat(),
+                "created_at": now.isoformat(),
+                "updated_at": now.isoformat()
+            })
         
-        result = appwrite_service.create_document(
-            collection_id=settings.email_collection_id,
-            data=email_data
-        )
+            result = await appwrite_service.create_document_async(
+                collection_id=settings.email_collection_id,
+                data=email_data
+            )
+            vector_index.index_document(result, ai_result.get("embedding"))
+            event_bus.publish_email_created(result)
         
-        return EmailResponse(**result)
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            return EmailResponse(**result)
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @router.get("/emails", response_model=List[EmailResponse])
 async def list_emails(
@@ -131,29 +175,153 @@ async def list_emails(
     limit: int = 50
 ) -> List[EmailResponse]:
     try:
+        emails = email_replica.list_emails(category.value if category else None, status.value if status else None, limit)
+        if emails is not None:
+            return fast_json_response(serialize_documents(EmailResponse, emails))
+
         queries = [Query.limit(limit)]
         if category:
             queries.append(Query.equal("category", category.value))
         if status:
             queries.append(Query.equal("status", status.value))
 
-        result = appwrite_service.list_documents(
+        result = await appwrite_service.list_documents_async(
             collection_id=settings.email_collection_id,
             queries=queries
         )
         
-        return [EmailResponse(**email) for email in result['documents']]
+        return fast_json_response(serialize_documents(EmailResponse, result['documents']))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/emails/export/{user_id}")
+async def export_emails(
+    user_id: str,
+    format: EmailExportFormat = EmailExportFormat.NDJSON,
+    box: EmailMailbox = EmailMailbox.ALL,
+    category: Optional[EmailCategory] = None,
+    email_status: Optional[EmailStatus] = QueryParam(None, alias="status"),
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    gzip: bool = False
+) -> StreamingResponse:
+    try:
+        chunks = email_export_service.export(
+            user_id=user_id,
+            export_format=format,
+            box=box,
+            category=category,
+            email_status=email_status,
+            created_after=created_after,
+            created_before=created_before,
+            compress=gzip
+        )
+        # Busca a primeira página antes de responder para que erros do Appwrite ainda virem 400
+        first_chunk = await asyncio.to_thread(next, chunks, b"")
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    media_type = "text/csv" if format == EmailExportFormat.CSV else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="emails-{user_id}.{format.value}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(chain([first_chunk], chunks), media_type=media_type, headers=headers)
+
+async def _search_hits_response(hits):
+    emails = await email_user_service.get_emails_by_ids([email_id for email_id, _ in hits])
+    scores = dict(hits)
+    return fast_json_response([
+        {"score": scores[email['$id']], "email": project_document(EmailResponse, email)}
+        for email in emails
+    ])
+
+@router.post("/emails/import/{user_id}", status_code=status.HTTP_202_ACCEPTED)
+async def import_mailbox(user_id: str, http_request: Request, file: UploadFile = File(..., description="mbox file or zip of .eml files")):
+    # O job roda na faixa de lote sem ocupar vaga, mas passa pelo rate limit e pela rejeição por sobrecarga
+    admission_controller.check(_admission_key(http_request))
+    try:
+        user = await appwrite_user_service.get_user_async(user_id)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    try:
+        path, size = await save_upload(file, settings.import_upload_dir)
+        print(f"📦 Mailbox upload for {user_id}: {size / 1024 / 1024:.1f} MB")
+        job = MailboxImportJob(
+            email_ai_service,
+            path,
+            user_id=user_id,
+            recipient_email=user.get("email", ""),
+            batch_size=settings.import_batch_size,
+            concurrency=settings.import_concurrency,
+            delete_after=True,
+        )
+        return mailbox_import_service.start(job)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/emails/import/jobs/{job_id}")
+async def get_mailbox_import(job_id: str):
+    job_status = mailbox_import_service.status(job_id)
+    if job_status is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Import job not found")
+    return job_status
+
+@router.get("/emails/events/{user_id}")
+async def email_events(user_id: str):
+    # Deltas de emails novos e mudanças de status; o cliente busca a caixa uma vez e aplica os eventos
+    return StreamingResponse(
+        event_bus.stream(user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/emails/search/{user_id}", response_model=List[EmailSearchHit])
+async def search_emails(user_id: str, q: str, limit: int = 10) -> List[EmailSearchHit]:
+    query_vector = await inference_service.embed_text(q)
+    if query_vector is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Embedding model unavailable")
+
+    try:
+        hits = vector_index.search(query_vector, owner=user_id, limit=limit)
+        return await _search_hits_response(hits)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/emails/{email_id}/similar", response_model=List[EmailSearchHit])
+async def get_similar_emails(email_id: str, user_id: str, limit: int = 10) -> List[EmailSearchHit]:
+    # Usa o embedding já indexado: nada é recodificado
+    email_vector = vector_index.get_vector(email_id)
+    if email_vector is None:
+        # Classificado pela cascata (ou indexado por outro worker ainda não salvo): calcula agora
+        try:
+            document = await appwrite_service.get_document_async(
+                collection_id=settings.email_collection_id,
+                document_id=email_id
+            )
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        email_vector = await inference_service.embed_text(f"{document.get('subject') or ''} {document.get('body') or ''}")
+        if email_vector is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Email not indexed")
+        vector_index.index_document(document, email_vector)
+
+    try:
+        hits = vector_index.search(email_vector, owner=user_id, limit=limit, exclude=email_id)
+        return await _search_hits_response(hits)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @router.get("/emails/{email_id}", response_model=EmailResponse)
-async def get_email(email_id: str) -> EmailResponse:
+async def get_email(request: Request, email_id: str) -> EmailResponse:
     try:
-        result = appwrite_service.get_document(
+        result = await appwrite_service.get_document_async(
             collection_id=settings.email_collection_id,
             document_id=email_id
         )
-        return EmailResponse(**result)
+        email = EmailResponse(**result).model_dump(mode="json", by_alias=True)
+        return conditional_json_response(request, email, documents_etag([result]))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Email not found")
 
@@ -162,8 +330,12 @@ async def update_email(email_id: str, email_update: EmailUpdate) -> EmailRespons
     try:
         update_data = {k: v for k, v in email_update.model_dump().items() if v is not None}
         update_data["updated_at"] = datetime.utcnow().isoformat()
+        if email_update.category is not None:
+            # Categoria corrigida pelo usuário: a reclassificação em massa não sobrescreve e o
+            # próximo treino da cabeça de classificação usa como exemplo com peso maior
+            update_data["category_source"] = CategorySource.USER.value
         
-        result = appwrite_service.update_document(
+        result = await appwrite_service.update_document_async(
             collection_id=settings.email_collection_id,
             document_id=email_id,
             data=update_data
@@ -175,10 +347,11 @@ async def update_email(email_id: str, email_update: EmailUpdate) -> EmailRespons
 @router.delete("/emails/{email_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_email(email_id: str) -> None:
     try:
-        appwrite_service.delete_document(
+        await appwrite_service.delete_document_async(
             collection_id=settings.email_collection_id,
             document_id=email_id
         )
+        vector_index.remove(email_id)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Email not found")
     
@@ -186,7 +359,7 @@ async def delete_email(email_id: str) -> None:
 async def test_inbox(user_id: str):
     try:
         # Teste básico sem queries complexas
-        result = appwrite_service.list_documents(
+        result = await appwrite_service.list_documents_async(
             collection_id=settings.email_collection_id,
             queries=[Query.limit(10)]
         )
@@ -205,33 +378,38 @@ async def test_inbox(user_id: str):
         }
 
 @router.post("/emails/{email_id}/reprocess", response_model=EmailResponse)
-async def reprocess_email(email_id: str) -> EmailResponse:
-    try:
-        email = appwrite_service.get_document(
-            collection_id=settings.email_collection_id,
-            document_id=email_id
-        )
+async def reprocess_email(email_id: str, http_request: Request) -> EmailResponse:
+    async with admission_controller.admit(_admission_key(http_request)):
+        try:
+            email = await appwrite_service.get_document_async(
+                collection_id=settings.email_collection_id,
+                document_id=email_id
+            )
         
-        ai_result = await email_ai_service.process_email(
-            content=email['body'],
-            subject=email['subject']
-        )
+            ai_result = await inference_service.process_email(
+                content=email['body'],
+                subject=email['subject']
+            )
         
-        update_data = {
-            "category": ai_result["category"],
-            "confidence_score": ai_result["confidence_score"],
-            "suggested_response": ai_result["suggested_response"],
-            "status": EmailStatus.PROCESSED,
-            "processed_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
-        }
+            update_data = {
+                "category": ai_result["category"],
+                "confidence_score": ai_result["confidence_score"],
+                "suggested_response": ai_result["suggested_response"],
+                "model_version": ai_result["model_version"],
+                "category_source": CategorySource.MODEL.value,
+                "status": EmailStatus.PROCESSED,
+                "processed_at": datetime.utcnow().isoformat(),
+                "updated_at": datetime.utcnow().isoformat()
+            }
         
-        result = appwrite_service.update_document(
-            collection_id=settings.email_collection_id,
-            document_id=email_id,
-            data=update_data
-        )
+            result = await appwrite_service.update_document_async(
+                collection_id=settings.email_collection_id,
+                document_id=email_id,
+                data=update_data
+            )
+            vector_index.index_document(result, ai_result.get("embedding"))
+            event_bus.publish_email_updated(result)
         
-        return EmailResponse(**result)
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Email not found")
\ No newline at end of file
+            return EmailResponse(**result)
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Email not found")
\ No newline at end of file
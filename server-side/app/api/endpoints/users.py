@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Request, status
 from typing import List
 
+from ..responses import serialize_documents, versioned_json_response
 from ...models.user import UserCreate, UserCreateSHA, UserUpdate, UserResponse
 from ...services.appwrite_user_service import appwrite_user_service
+from ...services.mailbox_versions import USERS_KEY
 
 router = APIRouter()
 
@@ -10,7 +12,7 @@ router = APIRouter()
 async def create_user(user: UserCreate) -> UserResponse:
     """Cria um novo usuário usando o Users service"""
     try:
-        result = appwrite_user_service.create_user(
+        result = await appwrite_user_service.create_user_async(
             email=user.email,
             password=user.password,
             name=user.name
@@ -22,7 +24,7 @@ async def create_user(user: UserCreate) -> UserResponse:
 @router.post("/users/sha", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def create_sha_user(user: UserCreateSHA) -> UserResponse:
     try:
-        result = appwrite_user_service.create_sha_user(
+        result = await appwrite_user_service.create_sha_user_async(
             email=user.email,
             password=user.password,
             name=user.name
@@ -34,16 +36,22 @@ async def create_sha_user(user: UserCreateSHA) -> UserResponse:
 @router.get("/users/{user_id}", response_model=UserResponse)
 async def get_user(user_id: str) -> UserResponse:
     try:
-        result = appwrite_user_service.get_user(user_id)
+        result = await appwrite_user_service.get_user_async(user_id)
         return UserResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
 @router.get("/users", response_model=List[UserResponse])
-async def list_users(search: str = None) -> List[UserResponse]:
+async def list_users(request: Request, search: str = None) -> List[UserResponse]:
     try:
-        result = appwrite_user_service.list_users(search=search)
-        return [UserResponse(**user) for user in result['users']]
+        return await versioned_json_response(
+            request,
+            key=USERS_KEY,
+            params=("users", search),
+            load=lambda: appwrite_user_service.list_users_async(search=search),
+            documents=lambda result: result['users'],
+            render=lambda result: serialize_documents(UserResponse, result['users'])
+        )
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
@@ -51,11 +59,11 @@ async def list_users(search: str = None) -> List[UserResponse]:
 async def update_user(user_id: str, user_update: UserUpdate) -> UserResponse:
     try:
         if user_update.email:
-            appwrite_user_service.update_email(user_id, user_update.email)
+            await appwrite_user_service.update_email_async(user_id, user_update.email)
         if user_update.name:
-            appwrite_user_service.update_user(user_id, name=user_update.name)
+            await appwrite_user_service.update_user_async(user_id, name=user_update.name)
         
-        result = appwrite_user_service.get_user(user_id)
+        result = await appwrite_user_service.get_user_async(user_id)
         return UserResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
@@ -63,7 +71,7 @@ async def update_user(user_id: str, user_update: UserUpdate) -> UserResponse:
 @router.patch("/users/{user_id}/status", response_model=UserResponse)
 async def toggle_user_status(user_id: str, status: bool) -> UserResponse:
     try:
-        result = appwrite_user_service.update_status(user_id, status)
+        result = await appwrite_user_service.update_user_status_async(user_id, status)
         return UserResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
@@ -71,6 +79,6 @@ async def toggle_user_status(user_id: str, status: bool) -> UserResponse:
 @router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(user_id: str) -> None:
     try:
-        appwrite_user_service.delete_user(user_id)
+        await appwrite_user_service.delete_user_async(user_id)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
\ No newline at end of file
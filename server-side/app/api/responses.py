@@ -0,0 +1,109 @@
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import PydanticUndefined
+
+from ..config import settings
+from ..services.mailbox_versions import documents_etag, mailbox_versions
+from ..services.metrics import metrics
+
+# O navegador guarda a resposta mas sempre revalida com If-None-Match
+CACHE_CONTROL = "private, no-cache"
+
+
+class _MissingField(Exception):
+    pass
+
+
+@lru_cache(maxsize=None)
+def _field_plan(model: Type[BaseModel]) -> Tuple[Tuple[str, str, bool, Any], ...]:
+    # (chave de saída/alias, nome do campo, obrigatório, default) - mesma forma que response_model gera com by_alias
+    plan = []
+    for name, field in model.model_fields.items():
+        default = None if field.default is PydanticUndefined else field.default
+        plan.append((field.alias or name, name, field.is_required(), default))
+    return tuple(plan)
+
+
+@lru_cache(maxsize=None)
+def list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def project_document(model: Type[BaseModel], document: Dict[str, Any]) -> Dict[str, Any]:
+    """Projeta um documento do Appwrite no formato do modelo sem validar (dados confiáveis)."""
+    projected = {}
+    for key, name, required, default in _field_plan(model):
+        if key in document:
+            value = document[key]
+        elif name in document:
+            value = document[name]
+        elif required:
+            raise _MissingField(key)
+        else:
+            value = default
+        projected[key] = value.value if isinstance(value, Enum) else value
+    return projected
+
+
+def serialize_documents(model: Type[BaseModel], documents: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    documents = list(documents)
+    if settings.trusted_appwrite_responses:
+        try:
+            return [project_document(model, document) for document in documents]
+        except _MissingField:
+            pass
+
+    # Documento fora do esperado: valida uma única vez com o TypeAdapter em cache
+    adapter = list_adapter(model)
+    return adapter.dump_python(adapter.validate_python(documents), mode="json", by_alias=True)
+
+
+def fast_json_response(content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> ORJSONResponse:
+    return ORJSONResponse(content=content, status_code=status_code, headers=headers)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Comparação fraca (RFC 9110): o prefixo W/ não conta
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def conditional_json_response(request: Request, content: Any, etag: str) -> Response:
+    if etag_matches(request, etag):
+        metrics.increment("http.not_modified.etag")
+        return not_modified(etag)
+    return fast_json_response(content, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+async def versioned_json_response(request: Request, key: str, params: tuple, load: Callable[[], Awaitable[Any]],
+                                  documents: Callable[[Any], Iterable[Dict[str, Any]]],
+                                  render: Callable[[Any], Any]) -> Response:
+    """GET condicional de uma listagem: 304 sem ler nada se a versão da caixa não mudou,
+    senão lê, recalcula o ETag pelos $updatedAt e só serializa se ele mudou."""
+    cached = mailbox_versions.cached_etag(key, params)
+    if cached is not None and etag_matches(request, cached):
+        metrics.increment("http.not_modified.version")
+        return not_modified(cached)
+
+    # Versão lida antes do Appwrite: uma escrita concorrente invalida o ETag guardado
+    version = mailbox_versions.version(key)
+    result = await load()
+    etag = documents_etag(documents(result), *params)
+    mailbox_versions.remember(key, params, version, etag)
+    if etag_matches(request, etag):
+        metrics.increment("http.not_modified.etag")
+        return not_modified(etag)
+    return fast_json_response(render(result), headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
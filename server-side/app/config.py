@@ -16,6 +16,109 @@ class Settings(BaseSettings):
     classification_model: str = os.getenv("CLASSIFICATION_MODEL")
     generation_model: str = os.getenv("GENERATION_MODEL")
 
+    # "local" roda os modelos no processo da API, "sidecar" fala com o run_inference.py
+    inference_backend: str = os.getenv("INFERENCE_BACKEND", "local")
+    inference_socket_path: str = os.getenv("INFERENCE_SOCKET_PATH", "/tmp/email-inference.sock")
+    inference_timeout: float = float(os.getenv("INFERENCE_TIMEOUT", "30"))
+    inference_reconnect_delay: float = float(os.getenv("INFERENCE_RECONNECT_DELAY", "5"))
+    inference_workers: int = int(os.getenv("INFERENCE_WORKERS", "1"))
+    # Itens da faixa de lote que esperaram mais que isso passam na frente dos interativos
+    inference_bulk_max_wait: float = float(os.getenv("INFERENCE_BULK_MAX_WAIT", "5"))
+    # Lotes são quebrados em itens desse tamanho: um interativo espera no máximo um pedaço
+    inference_bulk_chunk_size: int = int(os.getenv("INFERENCE_BULK_CHUNK_SIZE", "8"))
+
+    # Chamadas ao Appwrite: deadline por operação, retry só em leituras, circuit breaker e hedging
+    appwrite_read_timeout: float = float(os.getenv("APPWRITE_READ_TIMEOUT", "5"))
+    appwrite_write_timeout: float = float(os.getenv("APPWRITE_WRITE_TIMEOUT", "10"))
+    appwrite_read_retries: int = int(os.getenv("APPWRITE_READ_RETRIES", "2"))
+    appwrite_backoff_base: float = float(os.getenv("APPWRITE_BACKOFF_BASE", "0.1"))
+    appwrite_backoff_max: float = float(os.getenv("APPWRITE_BACKOFF_MAX", "2"))
+    appwrite_hedge_delay: float = float(os.getenv("APPWRITE_HEDGE_DELAY", "0"))
+    appwrite_breaker_threshold: int = int(os.getenv("APPWRITE_BREAKER_THRESHOLD", "5"))
+    appwrite_breaker_reset_timeout: float = float(os.getenv("APPWRITE_BREAKER_RESET_TIMEOUT", "30"))
+    appwrite_max_workers: int = int(os.getenv("APPWRITE_MAX_WORKERS", "16"))
+
+    # Listagens projetam documentos do Appwrite direto na resposta, sem revalidar
+    trusted_appwrite_responses: bool = os.getenv("TRUSTED_APPWRITE_RESPONSES", "true").lower() == "true"
+
+    # Índice vetorial local dos embeddings MiniLM (emails similares / busca semântica)
+    vector_index_enabled: bool = os.getenv("VECTOR_INDEX_ENABLED", "true").lower() == "true"
+    vector_index_path: str = os.getenv("VECTOR_INDEX_PATH", "data/vector_index.npz")
+    vector_index_quantize_threshold: int = int(os.getenv("VECTOR_INDEX_QUANTIZE_THRESHOLD", "200000"))
+    vector_index_autosave_interval: float = float(os.getenv("VECTOR_INDEX_AUTOSAVE_INTERVAL", "300"))
+
+    # Reaproveita a classificação de emails quase idênticos (MinHash-LSH) sem rodar os modelos
+    near_duplicate_enabled: bool = os.getenv("NEAR_DUPLICATE_ENABLED", "true").lower() == "true"
+    near_duplicate_threshold: float = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+    near_duplicate_capacity: int = int(os.getenv("NEAR_DUPLICATE_CAPACITY", "50000"))
+
+    # Modo cascata: palavras-chave primeiro, transformers só para emails ambíguos
+    cascade_enabled: bool = os.getenv("CASCADE_ENABLED", "false").lower() == "true"
+    cascade_min_margin: int = int(os.getenv("CASCADE_MIN_MARGIN", "2"))
+    cascade_min_confidence: float = float(os.getenv("CASCADE_MIN_CONFIDENCE", "0.8"))
+    cascade_audit_rate: float = float(os.getenv("CASCADE_AUDIT_RATE", "0.05"))
+
+    # Cabeça de classificação treinada sobre os embeddings MiniLM (substitui o RoBERTa quando existe)
+    classifier_head_enabled: bool = os.getenv("CLASSIFIER_HEAD_ENABLED", "true").lower() == "true"
+    classifier_head_path: str = os.getenv("CLASSIFIER_HEAD_PATH", "data/classifier_head.npz")
+    classifier_head_reload_interval: float = float(os.getenv("CLASSIFIER_HEAD_RELOAD_INTERVAL", "60"))
+    classifier_correction_weight: float = float(os.getenv("CLASSIFIER_CORRECTION_WEIGHT", "5"))
+
+    # Governança de recursos dos modelos: threads do torch, precisão, memória e ociosidade
+    web_concurrency: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+    torch_intra_op_threads: int = int(os.getenv("TORCH_INTRA_OP_THREADS", "0"))
+    torch_inter_op_threads: int = int(os.getenv("TORCH_INTER_OP_THREADS", "1"))
+    inference_precision: str = os.getenv("INFERENCE_PRECISION", "fp32")
+    inference_memory_budget_mb: int = int(os.getenv("INFERENCE_MEMORY_BUDGET_MB", "0"))
+    inference_idle_timeout: float = float(os.getenv("INFERENCE_IDLE_TIMEOUT", "0"))
+
+    # Controle de admissão das rotas com inferência: vagas globais, fila e limite por usuário
+    admission_max_concurrency: int = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "4"))
+    admission_max_queue: int = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+    admission_queue_timeout: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+    user_rate_limit_per_minute: float = float(os.getenv("USER_RATE_LIMIT_PER_MINUTE", "60"))
+    user_rate_limit_burst: int = int(os.getenv("USER_RATE_LIMIT_BURST", "10"))
+
+    # Push de eventos de email por SSE (/emails/events/{user_id})
+    events_queue_size: int = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+    events_heartbeat: float = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+
+    # Importação de mbox / zip de .eml (POST /emails/import/{user_id} e import_mailbox.py)
+    import_batch_size: int = int(os.getenv("IMPORT_BATCH_SIZE", "64"))
+    import_concurrency: int = int(os.getenv("IMPORT_CONCURRENCY", "8"))
+    import_upload_dir: str = os.getenv("IMPORT_UPLOAD_DIR", "data/imports")
+
+    # Profiling sob demanda (/admin/profiling): fração amostrada, modo (sampler | cprofile) e ring buffer
+    profiling_sample_rate: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+    profiling_mode: str = os.getenv("PROFILING_MODE", "sampler")
+    profiling_trace_memory: bool = os.getenv("PROFILING_TRACE_MEMORY", "false").lower() == "true"
+    profiling_buffer_size: int = int(os.getenv("PROFILING_BUFFER_SIZE", "20"))
+    profiling_sampler_interval: float = float(os.getenv("PROFILING_SAMPLER_INTERVAL", "0.005"))
+    profiling_header: str = os.getenv("PROFILING_HEADER", "X-Debug-Profile")
+    profiling_path_prefix: str = os.getenv("PROFILING_PATH_PREFIX", "")
+
+    # GET condicional (ETag/304) e compressão das respostas
+    etag_trust_seconds: float = float(os.getenv("ETAG_TRUST_SECONDS", "5"))
+    gzip_minimum_size: int = int(os.getenv("GZIP_MINIMUM_SIZE", "1024"))
+    gzip_level: int = int(os.getenv("GZIP_LEVEL", "6"))
+
+    # Réplica local (SQLite) da coleção de emails para inbox/sent/conversa/listagem
+    email_replica_enabled: bool = os.getenv("EMAIL_REPLICA_ENABLED", "false").lower() == "true"
+    email_replica_path: str = os.getenv("EMAIL_REPLICA_PATH", "data/email_replica.sqlite3")
+    email_replica_sync_interval: float = float(os.getenv("EMAIL_REPLICA_SYNC_INTERVAL", "2"))
+    email_replica_max_staleness: float = float(os.getenv("EMAIL_REPLICA_MAX_STALENESS", "10"))
+    email_replica_reconcile_interval: float = float(os.getenv("EMAIL_REPLICA_RECONCILE_INTERVAL", "3600"))
+    email_replica_page_size: int = int(os.getenv("EMAIL_REPLICA_PAGE_SIZE", "500"))
+
+    # Rotas /admin exigem o header X-Admin-Token; sem token configurado ficam desabilitadas
+    admin_token: str = os.getenv("ADMIN_TOKEN", "")
+
+    # Reclassificação em massa (reclassify.py / POST /admin/reclassify)
+    reclassify_checkpoint_path: str = os.getenv("RECLASSIFY_CHECKPOINT_PATH", "data/reclassify_checkpoint.json")
+    reclassify_batch_size: int = int(os.getenv("RECLASSIFY_BATCH_SIZE", "64"))
+    reclassify_concurrency: int = int(os.getenv("RECLASSIFY_CONCURRENCY", "8"))
+    reclassify_page_size: int = int(os.getenv("RECLASSIFY_PAGE_SIZE", "500"))
+
     class Config:
         env_file = "prod.env"
 
@@ -1,3 +1,6 @@
+import hmac
+from typing import Optional
+from fastapi import Header, HTTPException, status
 from appwrite.client import Client
 from appwrite.services.databases import Databases
 from appwrite.services.users import Users
@@ -17,3 +20,9 @@ def get_appwrite_databases():
 def get_appwrite_users():
     client = get_appwrite_client()
     return Users(client)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not settings.admin_token:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin endpoints are disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token")
@@ -1,6 +1,16 @@
+import asyncio
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .api.endpoints import users, emails
+from fastapi.middleware.gzip import GZipMiddleware
+from .api.endpoints import users, emails, admin
+from .services.vector_index import vector_index
+from .services.inference_service import inference_service
+from .services.inference_scheduler import PRIORITY_BULK
+from .services.email_replica import email_replica
+from .services.metrics import metrics
+from .services.admission_control import AdmissionRejected
+from .services.request_profiler import ProfilingMiddleware
 
 from .config import settings
 
@@ -29,8 +39,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Respostas com Content-Encoding (export com ?gzip=true) e text/event-stream passam sem recompressão
+app.add_middleware(GZipMiddleware, minimum_size=settings.gzip_minimum_size, compresslevel=settings.gzip_level)
+app.add_middleware(ProfilingMiddleware)
+
 app.include_router(users.router, prefix="/api/v1", tags=["users"])
 app.include_router(emails.router, prefix="/api/v1", tags=["emails"])
+app.include_router(admin.router, prefix="/api/v1", tags=["admin"])
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.on_event("startup")
+async def start_background_jobs():
+    if settings.vector_index_enabled:
+        vector_index.start_autosave(settings.vector_index_autosave_interval)
+        # Guarda a referência: o event loop só mantém referências fracas às tasks
+        app.state.vector_backfill = asyncio.create_task(
+            vector_index.run_backfill(lambda text: inference_service.embed_text(text, priority=PRIORITY_BULK))
+        )
+    if settings.email_replica_enabled:
+        email_replica.start_sync()
+
+@app.on_event("shutdown")
+async def flush_local_state():
+    if settings.vector_index_enabled:
+        vector_index.save()
 
 @app.get("/routes", tags=["admin"])
 async def get_routes():
@@ -45,6 +84,10 @@ async def get_routes():
             })
     return {"routes": routes}
 
+@app.get("/metrics", tags=["admin"])
+async def get_metrics():
+    return metrics.snapshot()
+
 @app.get("/", tags=["root"])
 async def root():
     return {
@@ -12,6 +12,19 @@ class EmailStatus(str, Enum):
     PROCESSED = "processed"
     FAILED = "failed"
     
+class CategorySource(str, Enum):
+    MODEL = "model"
+    USER = "user"
+
+class EmailExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+class EmailMailbox(str, Enum):
+    INBOX = "inbox"
+    SENT = "sent"
+    ALL = "all"
+    
 class EmailCreate(BaseModel):
     subject: str = Field(..., description="The subject of the email")
     body: str = Field(..., description="The body content of the email")
@@ -38,6 +51,8 @@ class EmailResponse(BaseModel):
     category: Optional[EmailCategory] = Field(None, description="The category of the email")
     confidence_score: Optional[float] = Field(..., description="The confidence score of the email classification(0-1)")
     suggested_response: Optional[str] = Field(None, description="AI suggested response to the email")
+    model_version: Optional[str] = Field(None, description="Version of the models/templates that classified the email")
+    category_source: Optional[CategorySource] = Field(None, description="Who set the category: the models or a user correction")
 
     status: EmailStatus = Field(default=EmailStatus.PENDING, description="The processing status of the email")
     is_read: bool = Field(default=False, description="Whether the email has been read")
@@ -67,4 +82,8 @@ class EmailProcessResponse(BaseModel):
 class EmailInboxResponse(BaseModel):
     total: int = Field(..., description="Total number of emails in the inbox")
     unread_count: int = Field(..., description="Total number of unread emails in the inbox")
-    emails: List[EmailResponse] = Field(..., description="List of emails in the inbox")
\ No newline at end of file
+    emails: List[EmailResponse] = Field(..., description="List of emails in the inbox")
+
+class EmailSearchHit(BaseModel):
+    score: float = Field(..., description="Cosine similarity between the query and the email (-1 to 1)")
+    email: EmailResponse = Field(..., description="The matching email")
\ No newline at end of file
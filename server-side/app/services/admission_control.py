@@ -0,0 +1,149 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict
+
+from ..config import settings
+from .metrics import metrics
+
+
+class AdmissionRejected(Exception):
+    """Requisição recusada antes de chegar aos modelos (429 por usuário, 503 por sobrecarga)."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consome um token; retorna 0 se conseguiu ou os segundos até o próximo token."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Controle de admissão das rotas que rodam inferência.
+
+    Cada usuário tem um token bucket (rate por minuto + burst); passando dele, no máximo
+    max_concurrency requisições rodam ao mesmo tempo e até max_queue esperam por uma vaga.
+    Fila cheia ou espera maior que queue_timeout viram 503 imediato com Retry-After, então
+    a latência sob sobrecarga fica limitada em vez de crescer sem controle.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float,
+                 user_rate_per_minute: float, user_burst: int, max_tracked_users: int = 10_000):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.user_rate = user_rate_per_minute / 60.0
+        self.user_burst = max(1, user_burst)
+        self.max_tracked_users = max_tracked_users
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._buckets_lock = threading.Lock()
+        self._active = 0
+        self._waiting = 0
+        # Média móvel do tempo de serviço, usada para estimar o Retry-After
+        self._service_time = 1.0
+
+    def _check_rate(self, key: str):
+        if self.user_rate <= 0:
+            return
+        with self._buckets_lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.user_rate, self.user_burst)
+                if len(self._buckets) > self.max_tracked_users:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(key)
+            wait = bucket.take()
+
+        if wait > 0:
+            metrics.increment("admission.rejected.rate_limited")
+            raise AdmissionRejected(429, "Too many requests for this user", wait)
+
+    def _estimated_wait(self) -> float:
+        return self._service_time * (self._waiting + 1) / self.max_concurrency
+
+    def _update_gauges(self):
+        metrics.set_gauge("admission.active", self._active)
+        metrics.set_gauge("admission.queue_depth", self._waiting)
+
+    def _check_capacity(self):
+        # Contadores próprios: o semáforo só reflete a aquisição depois que a task do wait_for roda
+        if self._active + self._waiting >= self.max_concurrency + self.max_queue:
+            metrics.increment("admission.rejected.queue_full")
+            raise AdmissionRejected(503, "Server is busy, try again later", self._estimated_wait())
+
+    def check(self, key: str):
+        """Rate limit e rejeição por sobrecarga sem ocupar vaga, para rotas que só disparam trabalho de lote."""
+        self._check_rate(key)
+        self._check_capacity()
+        metrics.increment("admission.admitted_bulk")
+
+    @asynccontextmanager
+    async def admit(self, key: str):
+        self._check_rate(key)
+        self._check_capacity()
+
+        self._waiting += 1
+        self._update_gauges()
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            metrics.increment("admission.rejected.queue_timeout")
+            raise AdmissionRejected(503, "Server is busy, try again later", self._estimated_wait())
+        finally:
+            self._waiting -= 1
+            self._update_gauges()
+
+        started = time.monotonic()
+        metrics.observe("admission.queue_wait", started - queued_at)
+        metrics.increment("admission.admitted")
+        self._active += 1
+        self._update_gauges()
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._semaphore.release()
+            self._update_gauges()
+            self._service_time = 0.9 * self._service_time + 0.1 * (time.monotonic() - started)
+
+    def status(self) -> Dict:
+        return {
+            "active": self._active,
+            "queue_depth": self._waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "tracked_users": len(self._buckets),
+            "estimated_wait": round(self._estimated_wait(), 3),
+        }
+
+
+admission_controller = AdmissionController(
+    max_concurrency=settings.admission_max_concurrency,
+    max_queue=settings.admission_max_queue,
+    queue_timeout=settings.admission_queue_timeout,
+    user_rate_per_minute=settings.user_rate_limit_per_minute,
+    user_burst=settings.user_rate_limit_burst,
+)
@@ -0,0 +1,252 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List
+
+from appwrite.exception import AppwriteException
+
+from ..config import settings
+from .metrics import metrics
+
+BREAKER_CLOSED = "closed"
+BREAKER_HALF_OPEN = "half_open"
+BREAKER_OPEN = "open"
+_BREAKER_GAUGE = {BREAKER_CLOSED: 0, BREAKER_HALF_OPEN: 1, BREAKER_OPEN: 2}
+
+
+class AppwriteTimeoutError(AppwriteException):
+    def __init__(self, operation: str, timeout: float):
+        super().__init__(f"Appwrite {operation} timed out after {timeout:.1f}s", 504, "timeout")
+
+
+class AppwriteUnavailableError(AppwriteException):
+    def __init__(self, operation: str):
+        super().__init__(f"Appwrite is unavailable (circuit open), {operation} not attempted", 503, "circuit_open")
+
+
+def is_transient(error: Exception) -> bool:
+    """Falhas que valem retry e contam para o circuit breaker: rede, timeout, 429 e 5xx."""
+    if isinstance(error, AppwriteTimeoutError):
+        return True
+    if isinstance(error, AppwriteException):
+        code = error.code or 0
+        return code == 0 or code == 429 or code >= 500
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+class CircuitBreaker:
+    """Abre depois de failure_threshold falhas transitórias seguidas; após reset_timeout deixa
+    passar uma chamada de teste (half-open) e fecha de novo se ela der certo."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = BREAKER_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def _set_state(self, state: str):
+        if state != self._state:
+            print(f"🔌 Appwrite circuit breaker: {self._state} -> {state}")
+            self._state = state
+            metrics.increment(f"appwrite.breaker.transitions.{state}")
+        metrics.set_gauge("appwrite.breaker.state", _BREAKER_GAUGE[state])
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == BREAKER_CLOSED:
+                return True
+            if self._state == BREAKER_OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state(BREAKER_HALF_OPEN)
+            if self._state == BREAKER_HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._set_state(BREAKER_CLOSED)
+
+    def release_probe(self):
+        """Sonda abortada sem resposta (cancelamento): o próximo chamador sonda de novo."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == BREAKER_HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(BREAKER_OPEN)
+
+
+class ResilientCaller:
+    """Executa chamadas do SDK do Appwrite com deadline, retry com jitter, circuit breaker e hedging.
+
+    O SDK não tem timeout próprio, então cada chamada roda num pool de threads e quem chama
+    espera no máximo o deadline da operação. Só leituras (idempotent=True) são repetidas;
+    leituras com hedge=True disparam uma segunda cópia se a primeira passar de hedge_delay.
+    """
+
+    def __init__(self, read_timeout: float, write_timeout: float, read_retries: int, backoff_base: float,
+                 backoff_max: float, hedge_delay: float, breaker: CircuitBreaker, max_workers: int = 16):
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.read_retries = read_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_delay = hedge_delay
+        self.breaker = breaker
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="appwrite")
+
+    def _wait_first(self, operation: str, futures: List[Future], timeout: float, deadline: float):
+        pending = set(futures)
+        error = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        raise AppwriteTimeoutError(operation, timeout)
+
+    def _attempt(self, operation: str, fn: Callable, kwargs: Dict, timeout: float, hedge: bool):
+        deadline = time.monotonic() + timeout
+        first = self._executor.submit(fn, **kwargs)
+
+        if hedge and 0 < self.hedge_delay < timeout:
+            done, _ = wait([first], timeout=self.hedge_delay)
+            if not done:
+                metrics.increment(f"appwrite.hedged.{operation}")
+                second = self._executor.submit(fn, **kwargs)
+                return self._wait_first(operation, [first, second], timeout, deadline)
+        return self._wait_first(operation, [first], timeout, deadline)
+
+    async def _wait_first_async(self, operation: str, futures: List[asyncio.Future], timeout: float, deadline: float):
+        loop = asyncio.get_running_loop()
+        pending = set(futures)
+        error = None
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        raise AppwriteTimeoutError(operation, timeout)
+
+    def _submit_async(self, fn: Callable, kwargs: Dict) -> asyncio.Future:
+        future = asyncio.wrap_future(self._executor.submit(fn, **kwargs))
+        # A cópia que perde o hedge (ou passa do deadline) termina sozinha; o erro dela não interessa
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return future
+
+    async def _attempt_async(self, operation: str, fn: Callable, kwargs: Dict, timeout: float, hedge: bool):
+        deadline = asyncio.get_running_loop().time() + timeout
+        first = self._submit_async(fn, kwargs)
+
+        if hedge and 0 < self.hedge_delay < timeout:
+            done, _ = await asyncio.wait([first], timeout=self.hedge_delay)
+            if not done:
+                metrics.increment(f"appwrite.hedged.{operation}")
+                second = self._submit_async(fn, kwargs)
+                return await self._wait_first_async(operation, [first, second], timeout, deadline)
+        return await self._wait_first_async(operation, [first], timeout, deadline)
+
+    def _before_attempt(self, operation: str):
+        if not self.breaker.allow():
+            metrics.increment("appwrite.breaker.rejected")
+            raise AppwriteUnavailableError(operation)
+
+    def _after_failure(self, operation: str, error: Exception, attempt: int, attempts: int) -> float:
+        """Registra a falha e devolve o backoff antes da próxima tentativa (ou relança)."""
+        if not is_transient(error):
+            # 4xx: o Appwrite respondeu, então está saudável
+            self.breaker.record_success()
+            raise error
+        self.breaker.record_failure()
+        metrics.increment("appwrite.timeouts" if isinstance(error, AppwriteTimeoutError) else "appwrite.errors")
+        if attempt == attempts - 1:
+            raise error
+        metrics.increment(f"appwrite.retries.{operation}")
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _after_success(self, operation: str, started: float):
+        self.breaker.record_success()
+        metrics.observe(f"appwrite.latency.{operation}", time.monotonic() - started)
+
+    def call(self, operation: str, fn: Callable, idempotent: bool = False, hedge: bool = False, **kwargs):
+        """Versão bloqueante, para threads de jobs e scripts; rotas usam call_async."""
+        timeout = self.read_timeout if idempotent else self.write_timeout
+        attempts = 1 + (self.read_retries if idempotent else 0)
+
+        for attempt in range(attempts):
+            self._before_attempt(operation)
+            started = time.monotonic()
+            try:
+                result = self._attempt(operation, fn, kwargs, timeout, hedge and idempotent)
+            except Exception as e:
+                time.sleep(self._after_failure(operation, e, attempt, attempts))
+                continue
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+            self._after_success(operation, started)
+            return result
+
+    async def call_async(self, operation: str, fn: Callable, idempotent: bool = False, hedge: bool = False, **kwargs):
+        """Mesma política de call, mas o SDK roda no pool e a espera (deadline, hedge, backoff)
+        acontece no event loop sem bloqueá-lo."""
+        timeout = self.read_timeout if idempotent else self.write_timeout
+        attempts = 1 + (self.read_retries if idempotent else 0)
+
+        for attempt in range(attempts):
+            self._before_attempt(operation)
+            started = time.monotonic()
+            try:
+                result = await self._attempt_async(operation, fn, kwargs, timeout, hedge and idempotent)
+            except Exception as e:
+                await asyncio.sleep(self._after_failure(operation, e, attempt, attempts))
+                continue
+            except BaseException:
+                # CancelledError (cliente desconectou): sem isso o half-open ficaria preso numa sonda que nunca volta
+                self.breaker.release_probe()
+                raise
+            self._after_success(operation, started)
+            return result
+
+
+appwrite_resilience = ResilientCaller(
+    read_timeout=settings.appwrite_read_timeout,
+    write_timeout=settings.appwrite_write_timeout,
+    read_retries=settings.appwrite_read_retries,
+    backoff_base=settings.appwrite_backoff_base,
+    backoff_max=settings.appwrite_backoff_max,
+    hedge_delay=settings.appwrite_hedge_delay,
+    breaker=CircuitBreaker(
+        failure_threshold=settings.appwrite_breaker_threshold,
+        reset_timeout=settings.appwrite_breaker_reset_timeout,
+    ),
+    max_workers=settings.appwrite_max_workers,
+)
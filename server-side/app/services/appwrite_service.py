@@ -1,28 +1,43 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 from appwrite.id import ID
 from appwrite.query import Query
 
 from ..dependencies import get_appwrite_databases
 from ..config import settings
+from .appwrite_resilience import appwrite_resilience
+from .mailbox_versions import mailbox_versions
 
 class AppwriteService:
     def __init__(self):
         self.database = get_appwrite_databases()
         self.database_id = settings.appwrite_database_id
+        # Réplicas locais (objetos com upsert/remove) atualizadas a cada escrita bem-sucedida
+        self._write_listeners: Dict[str, List[Any]] = {}
+
+    def add_write_listener(self, collection_id: str, listener: Any):
+        self._write_listeners.setdefault(collection_id, []).append(listener)
         
     def create_document(self, collection_id: str, data: Dict[str, Any], document_id: str = None) -> Dict[str, Any]:
         if not document_id:
             document_id = ID.unique()
             
-        return self.database.create_document(
+        result = appwrite_resilience.call(
+            "create_document",
+            self.database.create_document,
             database_id=self.database_id,
             collection_id=collection_id,
             document_id=document_id,
             data=data
         )
+        self._written(collection_id, result)
+        return result
     
     def get_document(self, collection_id: str, document_id: str) -> Dict[str, Any]:
-        return self.database.get_document(
+        return appwrite_resilience.call(
+            "get_document",
+            self.database.get_document,
+            idempotent=True,
+            hedge=True,
             database_id=self.database_id,
             collection_id=collection_id,
             document_id=document_id
@@ -31,25 +46,133 @@ class AppwriteService:
     def list_documents(self, collection_id: str, queries: Optional[list[str]] = None) -> Dict[str, Any]:
         if queries is None:
             queries = []
-        return self.database.list_documents(
+        return appwrite_resilience.call(
+            "list_documents",
+            self.database.list_documents,
+            idempotent=True,
+            hedge=True,
             database_id=self.database_id,
             collection_id=collection_id,
             queries=queries
         )
         
+    def iter_pages(self, collection_id: str, queries: Optional[list[str]] = None, page_size: int = 100, cursor: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        # Paginação por cursor: custo constante por página, independente do tamanho da coleção
+        while True:
+            page_queries = list(queries or []) + [Query.limit(page_size)]
+            if cursor:
+                page_queries.append(Query.cursor_after(cursor))
+
+            documents = self.list_documents(collection_id, page_queries)['documents']
+            if documents:
+                yield documents
+            if len(documents) < page_size:
+                return
+            cursor = documents[-1]['$id']
+
+    def iter_documents(self, collection_id: str, queries: Optional[list[str]] = None, page_size: int = 100) -> Iterator[Dict[str, Any]]:
+        for page in self.iter_pages(collection_id, queries, page_size):
+            yield from page
+
     def update_document(self, collection_id: str, document_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        return self.database.update_document(
+        result = appwrite_resilience.call(
+            "update_document",
+            self.database.update_document,
             database_id=self.database_id,
             collection_id=collection_id,
             document_id=document_id,
             data=data
         )
+        self._written(collection_id, result)
+        return result
 
     def delete_document(self, collection_id: str, document_id: str) -> None:
-        return self.database.delete_document(
+        appwrite_resilience.call(
+            "delete_document",
+            self.database.delete_document,
+            database_id=self.database_id,
+            collection_id=collection_id,
+            document_id=document_id
+        )
+        self._deleted(collection_id, document_id)
+
+    def _deleted(self, collection_id: str, document_id: str):
+        if collection_id == settings.email_collection_id:
+            mailbox_versions.bump_all()
+        for listener in self._write_listeners.get(collection_id, ()):
+            self._notify(listener.remove, document_id)
+
+    def _written(self, collection_id: str, document: Dict[str, Any]):
+        # Invalida os ETags das caixas de quem enviou e de quem recebeu
+        if collection_id == settings.email_collection_id:
+            mailbox_versions.bump_document(document)
+        for listener in self._write_listeners.get(collection_id, ()):
+            self._notify(listener.upsert, document)
+
+    # Versões assíncronas para rotas e serviços async: a espera pelo Appwrite não bloqueia o event loop
+
+    async def create_document_async(self, collection_id: str, data: Dict[str, Any], document_id: str = None) -> Dict[str, Any]:
+        result = await appwrite_resilience.call_async(
+            "create_document",
+            self.database.create_document,
+            database_id=self.database_id,
+            collection_id=collection_id,
+            document_id=document_id or ID.unique(),
+            data=data
+        )
+        self._written(collection_id, result)
+        return result
+
+    async def get_document_async(self, collection_id: str, document_id: str) -> Dict[str, Any]:
+        return await appwrite_resilience.call_async(
+            "get_document",
+            self.database.get_document,
+            idempotent=True,
+            hedge=True,
             database_id=self.database_id,
             collection_id=collection_id,
             document_id=document_id
         )
+
+    async def list_documents_async(self, collection_id: str, queries: Optional[list[str]] = None) -> Dict[str, Any]:
+        return await appwrite_resilience.call_async(
+            "list_documents",
+            self.database.list_documents,
+            idempotent=True,
+            hedge=True,
+            database_id=self.database_id,
+            collection_id=collection_id,
+            queries=queries or []
+        )
+
+    async def update_document_async(self, collection_id: str, document_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        result = await appwrite_resilience.call_async(
+            "update_document",
+            self.database.update_document,
+            database_id=self.database_id,
+            collection_id=collection_id,
+            document_id=document_id,
+            data=data
+        )
+        self._written(collection_id, result)
+        return result
+
+    async def delete_document_async(self, collection_id: str, document_id: str) -> None:
+        await appwrite_resilience.call_async(
+            "delete_document",
+            self.database.delete_document,
+            database_id=self.database_id,
+            collection_id=collection_id,
+            document_id=document_id
+        )
+        self._deleted(collection_id, document_id)
+
+    @staticmethod
+    def _notify(callback, *args):
+        # A escrita no Appwrite já aconteceu: falha na réplica não pode virar erro da requisição
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"❌ Error updating local replica: {e}")
             
 appwrite_service = AppwriteService()
\ No newline at end of file
@@ -4,6 +4,8 @@ from appwrite.enums import password_hash
 
 from ..dependencies import get_appwrite_users
 from ..config import settings
+from .appwrite_resilience import appwrite_resilience
+from .mailbox_versions import USERS_KEY, mailbox_versions
 
 class AppwriteUserService:
     def __init__(self):
@@ -13,44 +15,101 @@ class AppwriteUserService:
         if not user_id:
             user_id = ID.unique()
             
-        return self.users.create(
+        return self._written(appwrite_resilience.call(
+            "create_user",
+            self.users.create,
             user_id=user_id,
             email=email,
             password=password,
             name=name
-        )
+        ))
     
     def create_sha_user(self, email: str, password: str, name: str = None, user_id: str = None) -> Dict:
         if not user_id:
             user_id = ID.unique()
         
-        return self.users.create_sha_user(
+        return self._written(appwrite_resilience.call(
+            "create_sha_user",
+            self.users.create_sha_user,
             user_id=user_id,
             email=email,
             password=password,
             name=name,
             password_version=password_hash.SHA256
-        )
+        ))
         
     def get_user(self, user_id: str) -> Dict:
-        return self.users.get(user_id=user_id)
+        return appwrite_resilience.call("get_user", self.users.get, idempotent=True, user_id=user_id)
         
     def list_users(self, queries: Optional[List[str]] = None, search: str = None) -> Dict:
-        return self.users.list(queries=queries, search=search)
+        return appwrite_resilience.call("list_users", self.users.list, idempotent=True, queries=queries, search=search)
     
     def update_user(self, user_id: str, name: Optional[str] = None) -> Dict:
-        return self.users.update_name(user_id=user_id, name=name) if name else self.users.get(user_id=user_id)
+        if not name:
+            return self.get_user(user_id)
+        return self._written(appwrite_resilience.call("update_user_name", self.users.update_name, user_id=user_id, name=name))
     
     def update_email(self, user_id: str, email: str) -> Dict:
-        return self.users.update_email(user_id=user_id, email=email)
+        return self._written(appwrite_resilience.call("update_email", self.users.update_email, user_id=user_id, email=email))
 
     def update_password(self, user_id: str, password: str) -> Dict:
-        return self.users.update_password(user_id=user_id, password=password)
+        return appwrite_resilience.call("update_password", self.users.update_password, user_id=user_id, password=password)
     
     def delete_user(self, user_id: str) -> None:
-        self.users.delete(user_id=user_id)
+        appwrite_resilience.call("delete_user", self.users.delete, user_id=user_id)
+        mailbox_versions.bump(USERS_KEY)
         
     def update_user_status(self, user_id: str, is_active: bool) -> Dict:
-        return self.users.update_status(user_id=user_id, status=is_active)
+        return self._written(appwrite_resilience.call("update_user_status", self.users.update_status, user_id=user_id, status=is_active))
+
+    # Versões assíncronas para as rotas: a espera pelo Appwrite não bloqueia o event loop
+
+    async def create_user_async(self, email: str, password: str, name: str = None, user_id: str = None) -> Dict:
+        return self._written(await appwrite_resilience.call_async(
+            "create_user",
+            self.users.create,
+            user_id=user_id or ID.unique(),
+            email=email,
+            password=password,
+            name=name
+        ))
+
+    async def create_sha_user_async(self, email: str, password: str, name: str = None, user_id: str = None) -> Dict:
+        return self._written(await appwrite_resilience.call_async(
+            "create_sha_user",
+            self.users.create_sha_user,
+            user_id=user_id or ID.unique(),
+            email=email,
+            password=password,
+            name=name,
+            password_version=password_hash.SHA256
+        ))
+
+    async def get_user_async(self, user_id: str) -> Dict:
+        return await appwrite_resilience.call_async("get_user", self.users.get, idempotent=True, user_id=user_id)
+
+    async def list_users_async(self, queries: Optional[List[str]] = None, search: str = None) -> Dict:
+        return await appwrite_resilience.call_async("list_users", self.users.list, idempotent=True, queries=queries, search=search)
+
+    async def update_user_async(self, user_id: str, name: Optional[str] = None) -> Dict:
+        if not name:
+            return await self.get_user_async(user_id)
+        return self._written(await appwrite_resilience.call_async("update_user_name", self.users.update_name, user_id=user_id, name=name))
+
+    async def update_email_async(self, user_id: str, email: str) -> Dict:
+        return self._written(await appwrite_resilience.call_async("update_email", self.users.update_email, user_id=user_id, email=email))
+
+    async def delete_user_async(self, user_id: str) -> None:
+        await appwrite_resilience.call_async("delete_user", self.users.delete, user_id=user_id)
+        mailbox_versions.bump(USERS_KEY)
+
+    async def update_user_status_async(self, user_id: str, is_active: bool) -> Dict:
+        return self._written(await appwrite_resilience.call_async("update_user_status", self.users.update_status, user_id=user_id, status=is_active))
+
+    @staticmethod
+    def _written(user: Dict) -> Dict:
+        # A listagem /users muda: invalida o ETag guardado
+        mailbox_versions.bump(USERS_KEY)
+        return user
     
 appwrite_user_service = AppwriteUserService()
\ No newline at end of file
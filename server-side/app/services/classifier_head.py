@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+
+class ClassifierHead:
+    """Regressão logística sobre os embeddings MiniLM, treinada offline e trocada a quente.
+
+    Os pesos ficam num .npz (coef, intercept, classes, version); o processo recarrega o
+    arquivo quando o mtime muda, então um novo treino entra em produção sem restart. Quem
+    guarda resultados da cabeça antiga (cache de quase-duplicatas) se registra com
+    add_reload_listener para descartá-los na troca.
+    """
+
+    def __init__(self, path: str, reload_interval: float = 60.0):
+        self.path = path
+        self.reload_interval = reload_interval
+
+        self._lock = threading.Lock()
+        self._params: Optional[Tuple[np.ndarray, float, List[str], str]] = None
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._reload_listeners: List[Callable[[], None]] = []
+
+    @property
+    def version(self) -> Optional[str]:
+        params = self._params
+        return params[3] if params else None
+
+    @property
+    def available(self) -> bool:
+        return settings.classifier_head_enabled and self._params is not None
+
+    def add_reload_listener(self, callback: Callable[[], None]):
+        self._reload_listeners.append(callback)
+
+    def _notify_reload(self):
+        for callback in self._reload_listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️ Classifier head reload listener failed: {e}")
+
+    def reload(self) -> bool:
+        with self._lock:
+            previous = self.version
+            if not os.path.exists(self.path):
+                self._params, self._mtime = None, None
+                loaded = False
+            else:
+                mtime = os.path.getmtime(self.path)
+                data = np.load(self.path)
+                self._params = (
+                    data["coef"].astype(np.float32),
+                    float(data["intercept"]),
+                    [str(label) for label in data["classes"]],
+                    str(data["version"]),
+                )
+                self._mtime = mtime
+                loaded = True
+                print(f"🧠 Classifier head loaded (version {self._params[3]})")
+
+        if self.version != previous:
+            self._notify_reload()
+        return loaded
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval:
+            return
+        self._last_check = now
+
+        try:
+            mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+            if mtime != self._mtime:
+                self.reload()
+        except Exception as e:
+            print(f"❌ Error reloading classifier head: {e}")
+
+    def predict(self, embeddings: np.ndarray) -> List[Tuple[str, float]]:
+        """Retorna (categoria, probabilidade calibrada da categoria) para cada embedding."""
+        coef, intercept, classes, _ = self._params
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        positive = 1.0 / (1.0 + np.exp(-(embeddings @ coef + intercept)))
+
+        return [
+            (classes[1], float(p)) if p >= 0.5 else (classes[0], float(1.0 - p))
+            for p in positive
+        ]
+
+
+classifier_head = ClassifierHead(settings.classifier_head_path, reload_interval=settings.classifier_head_reload_interval)
+if settings.classifier_head_enabled:
+    try:
+        classifier_head.reload()
+    except Exception as e:
+        print(f"❌ Error loading classifier head: {e}")
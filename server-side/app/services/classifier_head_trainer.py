@@ -0,0 +1,108 @@
+import os
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+from ..config import settings
+from ..models.email import CategorySource, EmailCategory
+from .appwrite_service import appwrite_service
+from .email_ai_service import EmailAIService
+from .vector_index import vector_index
+
+_LABELS = {category.value for category in EmailCategory}
+
+
+def _collect_training_set(service: EmailAIService, correction_weight: float, encode_batch_size: int):
+    vectors: List[np.ndarray] = []
+    labels: List[str] = []
+    weights: List[float] = []
+    pending_texts: List[str] = []
+    pending_rows: List[int] = []
+    corrections = 0
+
+    for document in appwrite_service.iter_documents(settings.email_collection_id, page_size=500):
+        # Correções feitas via PUT /emails/{id} ficam marcadas no próprio documento
+        corrected = document.get("category_source") == CategorySource.USER.value
+        category = document.get("category")
+        if category not in _LABELS:
+            continue
+
+        # Reaproveita o embedding já indexado; só codifica o que não está no índice
+        vector = vector_index.get_vector(document['$id'])
+        if vector is None:
+            content = service.preprocess_text(document.get("body", ""))
+            subject = service.preprocess_text(document.get("subject", "")) if document.get("subject") else ""
+            pending_texts.append(f"{subject} {content}".strip())
+            pending_rows.append(len(vectors))
+        vectors.append(vector)
+        labels.append(category)
+        weights.append(correction_weight if corrected else 1.0)
+        corrections += corrected
+
+    for start in range(0, len(pending_texts), encode_batch_size):
+        encoded = service.embedding_model.encode(pending_texts[start:start + encode_batch_size])
+        for row, vector in zip(pending_rows[start:start + encode_batch_size], encoded):
+            vectors[row] = vector
+
+    return np.vstack(vectors).astype(np.float32), np.array(labels), np.array(weights, dtype=np.float32), corrections
+
+
+def train_classifier_head(
+    service: EmailAIService,
+    output_path: str = settings.classifier_head_path,
+    correction_weight: float = settings.classifier_correction_weight,
+    holdout: float = 0.2,
+    encode_batch_size: int = 128,
+) -> Dict:
+    """Treina a regressão logística sobre os emails armazenados e grava os pesos para hot-swap."""
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import accuracy_score, brier_score_loss, log_loss
+
+    if not service.has_models:
+        raise RuntimeError("Embedding model not loaded; cannot train the classifier head")
+
+    with service.using_models():
+        X, y, w, corrections = _collect_training_set(service, correction_weight, encode_batch_size)
+    if len(set(y)) < 2:
+        raise ValueError(f"Need examples of both categories to train, got {sorted(set(y))}")
+    print(f"📚 Training classifier head on {len(y)} emails ({corrections} user corrections)")
+
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(y))
+    split = int(len(y) * (1 - holdout))
+    train, test = order[:split], order[split:]
+
+    model = LogisticRegression(max_iter=1000, class_weight="balanced")
+    model.fit(X[train], y[train], sample_weight=w[train])
+
+    report = {"examples": int(len(y)), "corrections": corrections}
+    if len(test) and len(set(y[test])) == 2:
+        probabilities = model.predict_proba(X[test])[:, 1]
+        positive = (y[test] == model.classes_[1]).astype(int)
+        report.update({
+            "holdout_accuracy": float(accuracy_score(y[test], model.predict(X[test]))),
+            "holdout_log_loss": float(log_loss(positive, probabilities, labels=[0, 1])),
+            "holdout_brier": float(brier_score_loss(positive, probabilities)),
+        })
+
+    # Modelo final com todos os dados
+    model.fit(X, y, sample_weight=w)
+    version = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{output_path}.tmp.npz"
+    np.savez(
+        tmp_path,
+        coef=model.coef_[0].astype(np.float32),
+        intercept=np.float32(model.intercept_[0]),
+        classes=np.array(model.classes_, dtype=str),
+        version=np.array(version),
+    )
+    os.replace(tmp_path, output_path)
+
+    report["version"] = version
+    print(f"✅ Classifier head {version} saved to {output_path}: {report}")
+    return report
@@ -1,28 +1,77 @@
 import time
 import re
-from typing import Tuple, Dict
+import random
+import hashlib
+import json
+import gc
+import threading
+from contextlib import contextmanager
+from typing import Tuple, Dict, List, Optional
 from openai import OpenAI
-from ..config import Settings
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
-import torch
-from sentence_transformers import SentenceTransformer
+from ..config import Settings, settings
+from .metrics import metrics
+from .near_duplicate_service import near_duplicate_index
+from .classifier_head import classifier_head
+from .resource_governor import resource_governor
+from .inference_scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, inference_scheduler
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 
+CLASSIFICATION_MODEL_NAME = "cardiffnlp/twitter-roberta-base-sentiment-latest"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+SIMPLE_MODEL_VERSION = "simple-v1"
+
+# Resultados guardados foram calculados pela cabeça anterior: descarta na troca
+classifier_head.add_reload_listener(near_duplicate_index.clear)
+
+PRODUCTIVE_KEYWORDS = [
+    'solicitação', 'solicitacao', 'urgent', 'urgente', 'problema', 'erro', 'bug',
+    'suporte', 'help', 'ajuda', 'status', 'andamento', 'update', 'atualização',
+    'prazo', 'deadline', 'reunião', 'meeting', 'documento', 'arquivo', 'anexo',
+    'aprovação', 'aprovar', 'revisar', 'análise', 'pendente', 'pendencia'
+]
+
+UNPRODUCTIVE_KEYWORDS = [
+    'parabéns', 'parabens', 'feliz', 'aniversário', 'aniversario', 'natal',
+    'ano novo', 'obrigado', 'obrigada', 'thanks', 'thank you', 'agradeço',
+    'bom dia', 'boa tarde', 'boa noite', 'cumprimentos', 'saudações',
+]
+
 class EmailAIService:
-    def __init__(self):
+    def __init__(self, load_models: bool = True):
+        self._base_model_version = SIMPLE_MODEL_VERSION
+        self._models_lock = threading.RLock()
+        self._active = 0
+        self._last_used = time.monotonic()
+        self._unloaded = False
+        self._models_requested = False
+        if load_models:
+            self.ensure_models()
+        else:
+            # Modelos rodam no sidecar (run_inference.py); aqui só o classificador simples
+            self.classifier = None
+            self.embedding_model = None
+
+    def ensure_models(self):
+        """Carrega os modelos uma única vez, inclusive numa instância criada sem eles."""
+        if self._models_requested:
+            return
+        self._models_requested = True
         self._load_models()
+        resource_governor.start_idle_watcher(self)
     
     def _load_models(self):
         try:
             print("Loading classification model...")
-            
-            self.classifier = pipeline(
-                'text-classification',
-                model="cardiffnlp/twitter-roberta-base-sentiment-latest",
-                tokenizer="cardiffnlp/twitter-roberta-base-sentiment-latest",
+            started = time.monotonic()
+            # Imports pesados só quando os modelos realmente são carregados
+            from sentence_transformers import SentenceTransformer
+
+            resource_governor.configure_threads()
+            self._load_classifier()
+            self.embedding_model = resource_governor.load_model(
+                "embedding", lambda: resource_governor.apply_precision(SentenceTransformer(EMBEDDING_MODEL_NAME))
             )
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
             
             self.productive_templates = [
                 "preciso de ajuda com um problema urgente",
@@ -44,12 +93,115 @@ class EmailAIService:
             
             self.productive_embeddings = self.embedding_model.encode(self.productive_templates)
             self.unproductive_embeddings = self.embedding_model.encode(self.unproductive_templates)
-            print("Models loaded successfully.")
+            self._base_model_version = self._compute_model_version()
+            self._unloaded = False
+            self._enforce_memory_budget()
+            metrics.observe("models.load_time", time.monotonic() - started)
+            metrics.set_gauge("models.loaded", 1)
+            print(f"Models loaded successfully (version {self.model_version}).")
         except Exception as e:
             print(f"Error loading models: {e}")
             print("Falling back to simple classification method.")
             self.classifier = None
             self.embedding_model = None
+            self._base_model_version = SIMPLE_MODEL_VERSION
+            self._unloaded = False
+
+    def _load_classifier(self):
+        from transformers import pipeline
+
+        def _load():
+            classifier = pipeline(
+                'text-classification',
+                model=CLASSIFICATION_MODEL_NAME,
+                tokenizer=CLASSIFICATION_MODEL_NAME,
+            )
+            classifier.model = resource_governor.apply_precision(classifier.model)
+            return classifier
+
+        self.classifier = resource_governor.load_model("classifier", _load)
+
+    def _enforce_memory_budget(self):
+        if not resource_governor.over_budget():
+            return
+        # Com a cabeça treinada o RoBERTa não é usado: é o primeiro a sair quando o orçamento estoura
+        if self.classifier is not None and classifier_head.available:
+            self.classifier = None
+            resource_governor.forget_model("classifier")
+            gc.collect()
+            print("📉 Memory budget exceeded: classifier unloaded, classifier head in use")
+        else:
+            # Sem a cabeça os dois modelos são necessários: não ficam carregados acima do orçamento
+            metrics.increment("models.over_budget")
+            self.classifier = None
+            self.embedding_model = None
+            resource_governor.forget_model("classifier")
+            resource_governor.forget_model("embedding")
+            gc.collect()
+            raise MemoryError(f"models exceed the memory budget of {settings.inference_memory_budget_mb} MB")
+
+    @property
+    def has_models(self) -> bool:
+        """Processo roda os transformers (mesmo que estejam descarregados por ociosidade agora)."""
+        return self._unloaded or self.embedding_model is not None
+
+    @property
+    def models_loaded(self) -> bool:
+        return not self._unloaded and self.embedding_model is not None
+
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self._last_used
+
+    def _models_ready(self) -> bool:
+        return self.embedding_model is not None and (self.classifier is not None or classifier_head.available)
+
+    @contextmanager
+    def using_models(self):
+        """Marca os modelos como em uso (não são descarregados) e recarrega se estiverem descarregados."""
+        with self._models_lock:
+            if self._unloaded:
+                print("♻️ Reloading models after idle unload...")
+                self._load_models()
+            elif self.classifier is None and self.embedding_model is not None and not classifier_head.available:
+                # A cabeça sumiu depois que o RoBERTa foi liberado pelo orçamento de memória
+                self._load_classifier()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._models_lock:
+                self._active -= 1
+                self._last_used = time.monotonic()
+
+    def unload_models(self) -> bool:
+        with self._models_lock:
+            if self._active or not self.models_loaded:
+                return False
+            self.classifier = None
+            self.embedding_model = None
+            self._unloaded = True
+        resource_governor.forget_model("classifier")
+        resource_governor.forget_model("embedding")
+        gc.collect()
+        metrics.increment("models.unloads")
+        metrics.set_gauge("models.loaded", 0)
+        return True
+
+    @property
+    def model_version(self) -> str:
+        if self._base_model_version != SIMPLE_MODEL_VERSION and classifier_head.available:
+            return f"{self._base_model_version}+head-{classifier_head.version}"
+        return self._base_model_version
+
+    def _compute_model_version(self) -> str:
+        # Muda sempre que os modelos ou os templates mudam: emails com outra versão ficam "stale"
+        fingerprint = json.dumps([
+            CLASSIFICATION_MODEL_NAME,
+            EMBEDDING_MODEL_NAME,
+            self.productive_templates,
+            self.unproductive_templates,
+        ], ensure_ascii=False)
+        return "hf-" + hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()[:12]
 
     def preprocess_text(self, text: str) -> str:
         text = re.sub(r'[^\w\s\.\!\?\-]', ' ', text)  # Remove special characters except ., !, ?, -
@@ -60,19 +212,27 @@ class EmailAIService:
         return text[:512] if len(text) > 512 else text
     
     def classify_with_huggingface(self, content: str, subject: str = "") -> Tuple[str, float, str]:
+        category, confidence, response, _ = self._classify_with_embedding(content, subject)
+        return category, confidence, response
+
+    def _classify_with_embedding(self, content: str, subject: str = "") -> Tuple[str, float, str, Optional[np.ndarray]]:
         try:
             full_text = f"{subject} {content}".strip()
             
             if self.embedding_model is None:
-                return self.classify_email_simple(content, subject)
+                return (*self.classify_email_simple(content, subject), None)
             
             text_embedding = self.embedding_model.encode([full_text])
-            
-            productive_similarities = cosine_similarity(text_embedding, self.productive_embeddings)[0]
-            max_productive_sim = float(np.max(productive_similarities))
-            
-            unproductive_similarities = cosine_similarity(text_embedding, self.unproductive_embeddings)[0]
-            max_unproductive_sim = float(np.max(unproductive_similarities))
+            max_productive_sim, max_unproductive_sim = self._template_similarities(text_embedding)[0]
+
+            # Com a cabeça treinada disponível o RoBERTa não roda: um forward pass + produto escalar
+            classifier_head.maybe_reload()
+            if classifier_head.available:
+                category, confidence = classifier_head.predict(text_embedding)[0]
+                response = self._ai_response(category, content, subject, max_productive_sim)
+                metrics.increment("inference.classifier_head.predictions")
+                print(f"🧠 Classifier head ({classifier_head.version}): {category} ({confidence:.3f})")
+                return category, confidence, response, text_embedding[0]
             
             # ✅ Debug melhorado
             sentiment_result = self.classifier(full_text[:512])
@@ -84,44 +244,47 @@ class EmailAIService:
             print(f"   Sentiment Score: {sentiment_score:.3f}")
             print(f"   Sentiment Label: {sentiment_result[0]['label'] if sentiment_result else 'None'}")
             
-            if max_productive_sim > max_unproductive_sim:
-                category = "produtivo"
-                confidence = float(min(0.95, 0.5 + (max_productive_sim - max_unproductive_sim) + (sentiment_score * 0.2)))
-                response = self._generate_productive_response_ai(content, subject, max_productive_sim)
-            else:
-                category = "improdutivo"
-                confidence = float(min(0.95, 0.5 + (max_unproductive_sim - max_productive_sim) + (sentiment_score * 0.2)))
-                response = self._generate_unproductive_response_ai(content, subject)
+            category, confidence, response = self._decide(content, subject, max_productive_sim, max_unproductive_sim, sentiment_score)
 
             print(f"   Final Category: {category}")
             print(f"   Final Confidence: {confidence:.3f}")
             
-            return category, confidence, response
+            return category, confidence, response, text_embedding[0]
         except Exception as e:
             print(f"❌ Error classifying email: {e}")
             print(f"   Falling back to simple classification...")
-            return self.classify_email_simple(content, subject)
+            return (*self.classify_email_simple(content, subject), None)
 
-    def classify_email_simple(self, content: str, subject: str = "") -> Tuple[str, float, str]:
+    def _template_similarities(self, text_embeddings: np.ndarray) -> List[Tuple[float, float]]:
+        productive = cosine_similarity(text_embeddings, self.productive_embeddings).max(axis=1)
+        unproductive = cosine_similarity(text_embeddings, self.unproductive_embeddings).max(axis=1)
+        return [(float(p), float(u)) for p, u in zip(productive, unproductive)]
+
+    def _decide(self, content: str, subject: str, max_productive_sim: float, max_unproductive_sim: float, sentiment_score: float) -> Tuple[str, float, str]:
+        if max_productive_sim > max_unproductive_sim:
+            category = "produtivo"
+            confidence = float(min(0.95, 0.5 + (max_productive_sim - max_unproductive_sim) + (sentiment_score * 0.2)))
+        else:
+            category = "improdutivo"
+            confidence = float(min(0.95, 0.5 + (max_unproductive_sim - max_productive_sim) + (sentiment_score * 0.2)))
+        return category, confidence, self._ai_response(category, content, subject, max_productive_sim)
+
+    def _ai_response(self, category: str, content: str, subject: str, max_productive_sim: float) -> str:
+        if category == "produtivo":
+            return self._generate_productive_response_ai(content, subject, max_productive_sim)
+        return self._generate_unproductive_response_ai(content, subject)
+
+    def _keyword_scores(self, content: str, subject: str = "") -> Tuple[int, int]:
         content_lower = content.lower()
         subject_lower = subject.lower() if subject else ""
         full_text = f"{subject_lower} {content_lower}"
-    
-        productive_keywords = [
-            'solicitação', 'solicitacao', 'urgent', 'urgente', 'problema', 'erro', 'bug',
-            'suporte', 'help', 'ajuda', 'status', 'andamento', 'update', 'atualização',
-            'prazo', 'deadline', 'reunião', 'meeting', 'documento', 'arquivo', 'anexo',
-            'aprovação', 'aprovar', 'revisar', 'análise', 'pendente', 'pendencia'
-        ]
-        
-        unproductive_keywords = [
-            'parabéns', 'parabens', 'feliz', 'aniversário', 'aniversario', 'natal',
-            'ano novo', 'obrigado', 'obrigada', 'thanks', 'thank you', 'agradeço',
-            'bom dia', 'boa tarde', 'boa noite', 'cumprimentos', 'saudações',
-        ]
-        
-        productive_score = sum(1 for keyword in productive_keywords if keyword in full_text)
-        unproductive_score = sum(1 for keyword in unproductive_keywords if keyword in full_text)
+
+        productive_score = sum(1 for keyword in PRODUCTIVE_KEYWORDS if keyword in full_text)
+        unproductive_score = sum(1 for keyword in UNPRODUCTIVE_KEYWORDS if keyword in full_text)
+        return productive_score, unproductive_score
+
+    def classify_email_simple(self, content: str, subject: str = "") -> Tuple[str, float, str]:
+        productive_score, unproductive_score = self._keyword_scores(content, subject)
         
         if productive_score > unproductive_score:
             category = 'produtivo'
@@ -175,26 +338,180 @@ class EmailAIService:
         """Gera resposta para emails improdutivos (fallback)"""
         return "Agradecemos sua mensagem! Ficamos felizes em receber seu contato."
 
-    async def process_email(self, content: str, subject: str = "") -> Dict:
+    async def process_email(self, content: str, subject: str = "", priority: str = PRIORITY_INTERACTIVE) -> Dict:
+        return await inference_scheduler.run_async(self.process_email_sync, content, subject, priority=priority)
+
+    def process_email_sync(self, content: str, subject: str = "") -> Dict:
         start_time = time.time()
         
         # Preprocess the text
         clean_content = self.preprocess_text(content)
         clean_subject = self.preprocess_text(subject) if subject else ""
 
-        if self.classifier and self.embedding_model:
-            print("Classifying email with Hugging Face...")
-            category, confidence, suggested_response = self.classify_with_huggingface(clean_content, clean_subject)
-        else:
-            print('Classifying email with simple model...')
-            category, confidence, suggested_response = self.classify_email_simple(clean_content, clean_subject)
+        model_version = None
+        with self.using_models():
+            if self._models_ready():
+                reused = self._lookup_near_duplicate(clean_content, clean_subject)
+                cascaded = self._cascade_first_stage(clean_content, clean_subject) if reused is None else None
+                if reused is not None:
+                    # Sem embedding: o do vizinho não representa este texto, o índice vetorial calcula o próprio
+                    category, confidence, suggested_response = reused
+                    embedding, model_version = None, self.model_version
+                elif cascaded is not None:
+                    # Veio do classificador por palavras-chave, mesmo quando a auditoria deixou o embedding
+                    category, confidence, suggested_response, embedding = cascaded
+                    model_version = SIMPLE_MODEL_VERSION
+                else:
+                    print("Classifying email with Hugging Face...")
+                    category, confidence, suggested_response, embedding = self._classify_with_embedding(clean_content, clean_subject)
+                    metrics.increment("inference.model_invocations")
+                    if embedding is not None:
+                        self._remember_near_duplicate(clean_content, clean_subject, category, confidence, suggested_response)
+            else:
+                print('Classifying email with simple model...')
+                category, confidence, suggested_response = self.classify_email_simple(clean_content, clean_subject)
+                embedding = None
         processing_time = time.time() - start_time
+        metrics.observe("inference.processing_time", processing_time)
+
+        return self._build_result(category, confidence, suggested_response, processing_time, embedding, model_version)
 
+    def _build_result(self, category: str, confidence: float, suggested_response: str, processing_time: float,
+                      embedding: Optional[np.ndarray], model_version: Optional[str] = None) -> Dict:
+        if model_version is None:
+            model_version = self.model_version if embedding is not None else SIMPLE_MODEL_VERSION
         return {
             "category": category,
             "confidence_score": float(confidence),
             "suggested_response": suggested_response,
             "processing_time": float(processing_time),
+            "embedding": embedding,  # vetor MiniLM para o índice vetorial (None no modo simples)
+            "model_version": model_version,
         }
+
+    def process_emails_batch_sync(self, emails: List[Tuple[str, str]]) -> List[Dict]:
+        """Classifica vários emails (content, subject) com um único forward pass por modelo."""
+        if not emails:
+            return []
+
+        with self.using_models():
+            return self._classify_batch(emails)
+
+    def process_emails_batch(self, emails: List[Tuple[str, str]], priority: str = PRIORITY_BULK) -> List[Dict]:
+        """Igual a process_emails_batch_sync, mas passando pela fila de inferência (faixa de lote por padrão)."""
+        return inference_scheduler.run_chunked(self.process_emails_batch_sync, emails, priority=priority)
+
+    def _classify_batch(self, emails: List[Tuple[str, str]]) -> List[Dict]:
+        start_time = time.time()
+        cleaned = [(self.preprocess_text(content), self.preprocess_text(subject) if subject else "") for content, subject in emails]
+
+        if not self._models_ready():
+            return [self.process_email_sync(content, subject) for content, subject in emails]
+
+        texts = [f"{subject} {content}".strip() for content, subject in cleaned]
+        classifier_head.maybe_reload()
+        use_head = classifier_head.available
+        try:
+            embeddings = self.embedding_model.encode(texts)
+            sentiments = None if use_head else self.classifier([text[:512] for text in texts])
+        except Exception as e:
+            print(f"❌ Error classifying batch of {len(texts)} emails: {e}")
+            return [self.process_email_sync(content, subject) for content, subject in emails]
+
+        similarities = self._template_similarities(embeddings)
+        metrics.increment("inference.model_invocations", len(texts))
+        processing_time = (time.time() - start_time) / len(texts)
+
+        results = []
+        if use_head:
+            predictions = classifier_head.predict(embeddings)
+            for (content, subject), embedding, (max_productive_sim, _), (category, confidence) in zip(cleaned, embeddings, similarities, predictions):
+                response = self._ai_response(category, content, subject, max_productive_sim)
+                results.append(self._build_result(category, confidence, response, processing_time, embedding))
+            return results
+
+        for (content, subject), embedding, (max_productive_sim, max_unproductive_sim), sentiment in zip(cleaned, embeddings, similarities, sentiments):
+            sentiment_score = float(sentiment['score']) if sentiment else 0.5
+            category, confidence, response = self._decide(content, subject, max_productive_sim, max_unproductive_sim, sentiment_score)
+            results.append(self._build_result(category, confidence, response, processing_time, embedding))
+        return results
+
+    def _cascade_first_stage(self, content: str, subject: str) -> Optional[Tuple[str, float, str, Optional[np.ndarray]]]:
+        """Primeiro estágio do modo cascata: aceita o classificador por palavras-chave quando ele é confiante.
+
+        O embedding só vem preenchido quando a amostra de auditoria rodou o pipeline completo.
+        """
+        if not settings.cascade_enabled:
+            return None
+
+        productive_score, unproductive_score = self._keyword_scores(content, subject)
+        category, confidence, response = self.classify_email_simple(content, subject)
+        confident = (
+            abs(productive_score - unproductive_score) >= settings.cascade_min_margin
+            and confidence >= settings.cascade_min_confidence
+        )
+
+        if not confident:
+            metrics.increment("inference.cascade.escalated")
+            self._update_cascade_rates()
+            return None
+
+        metrics.increment("inference.cascade.accepted")
+        self._update_cascade_rates()
+
+        # Amostra de auditoria: roda o pipeline completo para medir a concordância com o 1º estágio
+        embedding = None
+        if settings.cascade_audit_rate > 0 and random.random() < settings.cascade_audit_rate:
+            full_category, _, _, embedding = self._classify_with_embedding(content, subject)
+            metrics.increment("inference.model_invocations")
+            metrics.increment("inference.cascade.audit.agree" if full_category == category else "inference.cascade.audit.disagree")
+            self._update_cascade_rates()
+
+        return category, confidence, response, embedding
+
+    def _update_cascade_rates(self):
+        accepted = metrics.counter("inference.cascade.accepted")
+        escalated = metrics.counter("inference.cascade.escalated")
+        agree = metrics.counter("inference.cascade.audit.agree")
+        disagree = metrics.counter("inference.cascade.audit.disagree")
+
+        if accepted + escalated:
+            metrics.set_gauge("inference.cascade.escalation_rate", escalated / (accepted + escalated))
+        if agree + disagree:
+            metrics.set_gauge("inference.cascade.audit.agreement_rate", agree / (agree + disagree))
+
+    def _lookup_near_duplicate(self, content: str, subject: str) -> Optional[Tuple[str, float, str]]:
+        if not settings.near_duplicate_enabled:
+            return None
+
+        match = near_duplicate_index.lookup(f"{subject} {content}")
+        if match is None:
+            metrics.increment("inference.near_duplicate.misses")
+            return None
+
+        entry, similarity = match
+        metrics.increment("inference.near_duplicate.hits")
+        metrics.observe("inference.near_duplicate.similarity", similarity)
+        print(f"♻️ Near-duplicate reused (similarity {similarity:.3f}): {entry['category']}")
+        return entry["category"], entry["confidence_score"], entry["suggested_response"]
+
+    def _remember_near_duplicate(self, content: str, subject: str, category: str, confidence: float, suggested_response: str):
+        if not settings.near_duplicate_enabled:
+            return
+        near_duplicate_index.add(f"{subject} {content}", {
+            "category": category,
+            "confidence_score": float(confidence),
+            "suggested_response": suggested_response,
+        })
+
+    async def embed_text(self, text: str, priority: str = PRIORITY_INTERACTIVE) -> Optional[np.ndarray]:
+        return await inference_scheduler.run_async(self.embed_text_sync, text, priority=priority)
+
+    def embed_text_sync(self, text: str) -> Optional[np.ndarray]:
+        with self.using_models():
+            if self.embedding_model is None:
+                return None
+            clean_text = self.preprocess_text(text)
+            return self.embedding_model.encode([clean_text])[0]
         
-email_ai_service = EmailAIService()
\ No newline at end of file
+email_ai_service = EmailAIService(load_models=settings.inference_backend == "local")
\ No newline at end of file
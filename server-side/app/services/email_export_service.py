@@ -0,0 +1,113 @@
+import csv
+import io
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+import orjson
+from appwrite.query import Query
+
+from ..models.email import EmailCategory, EmailExportFormat, EmailMailbox, EmailResponse, EmailStatus
+from ..services.appwrite_service import appwrite_service
+from ..config import settings
+
+EXPORT_PAGE_SIZE = 500
+EXPORT_FIELDS = [field.alias or name for name, field in EmailResponse.model_fields.items()]
+
+
+def _utc_iso(value: datetime) -> str:
+    # created_at é gravado em UTC sem fuso
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+
+class EmailExportService:
+    def __init__(self):
+        pass
+
+    def build_queries(
+        self,
+        user_id: str,
+        box: EmailMailbox = EmailMailbox.ALL,
+        category: Optional[EmailCategory] = None,
+        email_status: Optional[EmailStatus] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> List[str]:
+        if box == EmailMailbox.INBOX:
+            queries = [Query.equal("recipient_user_id", user_id)]
+        elif box == EmailMailbox.SENT:
+            queries = [Query.equal("sender_user_id", user_id)]
+        else:
+            queries = [Query.or_queries([
+                Query.equal("recipient_user_id", user_id),
+                Query.equal("sender_user_id", user_id),
+            ])]
+
+        if category:
+            queries.append(Query.equal("category", category.value))
+        if email_status:
+            queries.append(Query.equal("status", email_status.value))
+        if created_after:
+            queries.append(Query.greater_than_equal("created_at", _utc_iso(created_after)))
+        if created_before:
+            queries.append(Query.less_than("created_at", _utc_iso(created_before)))
+        return queries
+
+    def _row(self, document: Dict) -> Dict:
+        return {field: document.get(field) for field in EXPORT_FIELDS}
+
+    def _iter_ndjson(self, pages: Iterator[List[Dict]]) -> Iterator[bytes]:
+        # Um chunk por página: o primeiro sai assim que a primeira página chega
+        for page in pages:
+            yield b"".join(orjson.dumps(self._row(document)) + b"\n" for document in page)
+
+    def _iter_csv(self, pages: Iterator[List[Dict]]) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+
+        for page in pages:
+            writer.writerows(self._row(document) for document in page)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    def _gzip(self, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        compressor = zlib.compressobj(wbits=31)  # 31 = container gzip
+        for chunk in chunks:
+            # Sync flush por chunk para o cliente receber os dados sem esperar o fim do export
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+    def export(
+        self,
+        user_id: str,
+        export_format: EmailExportFormat = EmailExportFormat.NDJSON,
+        box: EmailMailbox = EmailMailbox.ALL,
+        category: Optional[EmailCategory] = None,
+        email_status: Optional[EmailStatus] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        compress: bool = False,
+    ) -> Iterator[bytes]:
+        queries = self.build_queries(user_id, box, category, email_status, created_after, created_before)
+        pages = appwrite_service.iter_pages(
+            collection_id=settings.email_collection_id,
+            queries=queries,
+            page_size=EXPORT_PAGE_SIZE,
+        )
+
+        if export_format == EmailExportFormat.CSV:
+            chunks = self._iter_csv(pages)
+        else:
+            chunks = self._iter_ndjson(pages)
+
+        return self._gzip(chunks) if compress else chunks
+
+
+email_export_service = EmailExportService()
@@ -0,0 +1,350 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import orjson
+from appwrite.query import Query
+
+from ..config import settings
+from .appwrite_service import appwrite_service
+from .metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos (desenvolvimento com um worker)
+    fcntl = None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS emails (
+    id TEXT PRIMARY KEY,
+    sender_user_id TEXT,
+    recipient_user_id TEXT,
+    category TEXT,
+    status TEXT,
+    is_read INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    document BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS emails_recipient_created ON emails (recipient_user_id, created_at);
+CREATE INDEX IF NOT EXISTS emails_sender_created ON emails (sender_user_id, created_at);
+CREATE INDEX IF NOT EXISTS emails_category_status ON emails (category, status);
+CREATE INDEX IF NOT EXISTS emails_updated ON emails (updated_at);
+CREATE TABLE IF NOT EXISTS replica_state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS replica_tombstones (id TEXT PRIMARY KEY, removed_at REAL NOT NULL);
+"""
+
+# Muda quando o conteúdo das colunas muda: a réplica é descartada e recarregada do zero
+_ROW_FORMAT = "2"
+
+# Só aplica a versão recebida se ela não for mais velha que a já gravada (escrita local x sync)
+_UPSERT = """
+INSERT INTO emails (id, sender_user_id, recipient_user_id, category, status, is_read, created_at, updated_at, document)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    sender_user_id = excluded.sender_user_id,
+    recipient_user_id = excluded.recipient_user_id,
+    category = excluded.category,
+    status = excluded.status,
+    is_read = excluded.is_read,
+    created_at = excluded.created_at,
+    updated_at = excluded.updated_at,
+    document = excluded.document
+WHERE excluded.updated_at >= emails.updated_at
+"""
+
+
+class EmailReplica:
+    """Réplica local (SQLite) da coleção de emails para as listagens quentes.
+
+    As escritas feitas pela API entram na hora (write-through via AppwriteService); o resto
+    chega pela sincronização incremental por $updatedAt a cada sync_interval. Uma varredura
+    de ids a cada reconcile_interval remove o que foi apagado fora daqui. As leituras só usam
+    a réplica se a última sincronização bem-sucedida começou há no máximo max_staleness
+    segundos; senão devolvem None e quem chama consulta o Appwrite.
+
+    Os workers do host compartilham o arquivo: só o que segura o lock de sincronização roda
+    sync e reconcile (outro assume se ele morrer), e o horário da última sincronização e os
+    apagados ficam no próprio SQLite. Leituras usam uma conexão só de leitura por thread,
+    sem o lock das escritas, e o WAL as deixa correr em paralelo com a sincronização.
+    """
+
+    def __init__(self, path: str, sync_interval: float = 2.0, max_staleness: float = 10.0,
+                 reconcile_interval: float = 3600.0, page_size: int = 500):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.max_staleness = max_staleness
+        self.reconcile_interval = reconcile_interval
+        self.page_size = page_size
+
+        # Protege só a conexão de escrita; leituras não passam por ele
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._readers = threading.local()
+        self._leader_file = None
+        self._reconciled_at = 0.0
+        self._sync_thread: Optional[threading.Thread] = None
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.executescript(_SCHEMA)
+        row = conn.execute("SELECT value FROM replica_state WHERE key = 'row_format'").fetchone()
+        if (row[0] if row else None) != _ROW_FORMAT:
+            with conn:
+                conn.execute("DELETE FROM emails")
+                conn.execute("DELETE FROM replica_state")
+                conn.execute("INSERT INTO replica_state (key, value) VALUES ('row_format', ?)", (_ROW_FORMAT,))
+        with self._lock:
+            self._conn = conn
+        count = conn.execute("SELECT COUNT(*) FROM emails").fetchone()[0]
+        print(f"📂 Email replica opened: {count} emails in {self.path}")
+
+    # --- escrita -------------------------------------------------------------------------
+
+    @staticmethod
+    def _row(document: Dict) -> tuple:
+        return (
+            document["$id"],
+            document.get("sender_user_id"),
+            document.get("recipient_user_id"),
+            document.get("category"),
+            document.get("status"),
+            1 if document.get("is_read") else 0,
+            # Data original do email (importados guardam o header Date), não a da gravação
+            document.get("created_at") or document.get("$createdAt") or "",
+            document.get("$updatedAt") or "",
+            orjson.dumps(document),
+        )
+
+    def _upsert_many(self, documents: Iterable[Dict], from_sync: bool = False):
+        documents = list(documents)
+        ids = [(document["$id"],) for document in documents]
+        with self._lock:
+            if self._conn is None:
+                return
+            with self._conn:
+                if from_sync:
+                    # Apagados pela API: uma página de sync já em voo não pode trazê-los de volta
+                    placeholders = ",".join("?" * len(ids))
+                    removed = {row[0] for row in self._conn.execute(
+                        f"SELECT id FROM replica_tombstones WHERE id IN ({placeholders})", [doc_id for (doc_id,) in ids]
+                    )} if ids else set()
+                    documents = [document for document in documents if document["$id"] not in removed]
+                else:
+                    self._conn.executemany("DELETE FROM replica_tombstones WHERE id = ?", ids)
+                self._conn.executemany(_UPSERT, [self._row(document) for document in documents])
+
+    def upsert(self, document: Dict):
+        self._upsert_many([document])
+
+    def remove(self, document_id: str):
+        with self._lock:
+            if self._conn is None:
+                return
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO replica_tombstones (id, removed_at) VALUES (?, ?)", (document_id, time.time()))
+                self._conn.execute("DELETE FROM emails WHERE id = ?", (document_id,))
+
+    # --- sincronização -------------------------------------------------------------------
+
+    def _state(self, key: str) -> Optional[str]:
+        row = self._reader().execute("SELECT value FROM replica_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO replica_state (key, value) VALUES (?, ?)", (key, value))
+
+    def sync(self) -> int:
+        """Traz tudo com $updatedAt >= cursor. Sem cursor (primeira vez) é a carga completa."""
+        with self._sync_lock:
+            started = time.monotonic()
+            cursor = self._state("updated_cursor")
+            queries = [Query.order_asc("$updatedAt")]
+            if cursor:
+                # >= e não >: documentos com o mesmo timestamp do cursor podem ter chegado depois
+                queries.insert(0, Query.greater_than_equal("$updatedAt", cursor))
+
+            synced = 0
+            for page in appwrite_service.iter_pages(settings.email_collection_id, queries, page_size=self.page_size):
+                self._upsert_many(page, from_sync=True)
+                synced += len(page)
+                cursor = max(cursor or "", page[-1].get("$updatedAt") or "")
+                self._set_state("updated_cursor", cursor)
+
+            # Relógio de parede: o valor é lido pelos outros workers
+            self._set_state("synced_at", repr(time.time() - (time.monotonic() - started)))
+            self._prune_tombstones()
+            metrics.observe("replica.sync_seconds", time.monotonic() - started)
+            metrics.set_gauge("replica.emails", self.count())
+            return synced
+
+    def reconcile(self) -> int:
+        """Remove da réplica o que não existe mais no Appwrite (apagado por outro processo)."""
+        with self._sync_lock:
+            cursor = self._state("updated_cursor") or ""
+            remote_ids = set()
+            for page in appwrite_service.iter_pages(settings.email_collection_id, [Query.select(["$id"])], page_size=self.page_size):
+                remote_ids.update(document["$id"] for document in page)
+
+            # Só o que já existia no início da varredura: documentos novos podem não ter aparecido nas páginas
+            local_ids = [row[0] for row in self._reader().execute("SELECT id FROM emails WHERE updated_at <= ?", (cursor,))]
+            stale = [(document_id,) for document_id in local_ids if document_id not in remote_ids]
+            with self._lock:
+                with self._conn:
+                    self._conn.executemany("DELETE FROM emails WHERE id = ?", stale)
+
+            self._reconciled_at = time.monotonic()
+            if stale:
+                print(f"🧹 Email replica reconciled: {len(stale)} deleted emails removed")
+            return len(stale)
+
+    def _prune_tombstones(self):
+        horizon = time.time() - max(self.max_staleness, self.sync_interval) * 2
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM replica_tombstones WHERE removed_at < ?", (horizon,))
+
+    def _acquire_leadership(self) -> bool:
+        """Só um processo do host sincroniza; o lock some junto com o processo que o segura."""
+        if self._leader_file is not None or fcntl is None:
+            return True
+        handle = open(f"{self.path}.sync.lock", "a+")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._leader_file = handle
+        print(f"🔁 Email replica sync running in process {os.getpid()}")
+        return True
+
+    def start_sync(self):
+        if self._sync_thread is not None or self._conn is None:
+            return
+
+        def _run():
+            while True:
+                try:
+                    if not self._acquire_leadership():
+                        # Outro worker sincroniza; tenta de novo caso ele morra
+                        time.sleep(self.sync_interval)
+                        continue
+                    synced = self.sync()
+                    if synced:
+                        metrics.increment("replica.synced_documents", synced)
+                    if time.monotonic() - self._reconciled_at >= self.reconcile_interval:
+                        self.reconcile()
+                except Exception as e:
+                    metrics.increment("replica.sync_errors")
+                    print(f"❌ Error syncing email replica: {e}")
+                time.sleep(self.sync_interval)
+
+        self._sync_thread = threading.Thread(target=_run, name="email-replica-sync", daemon=True)
+        self._sync_thread.start()
+
+    # --- leitura -------------------------------------------------------------------------
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA query_only=ON")
+            self._readers.conn = conn
+        return conn
+
+    def _seconds_since_sync(self) -> Optional[float]:
+        synced_at = self._state("synced_at")
+        return time.time() - float(synced_at) if synced_at else None
+
+    @property
+    def fresh(self) -> bool:
+        if self._conn is None:
+            return False
+        age = self._seconds_since_sync()
+        return age is not None and age <= self.max_staleness
+
+    def _query(self, sql: str, params: tuple) -> Optional[List[Dict]]:
+        if not self.fresh:
+            metrics.increment("replica.fallbacks")
+            return None
+        started = time.perf_counter()
+        rows = self._reader().execute(sql, params).fetchall()
+        metrics.observe("replica.query_seconds", time.perf_counter() - started)
+        metrics.increment("replica.hits")
+        return [orjson.loads(row[0]) for row in rows]
+
+    def inbox(self, user_id: str, limit: int, include_read: bool = True) -> Optional[List[Dict]]:
+        unread = "" if include_read else " AND is_read = 0"
+        return self._query(
+            f"SELECT document FROM emails WHERE recipient_user_id = ?{unread} ORDER BY created_at DESC LIMIT ?",
+            (user_id, limit),
+        )
+
+    def sent(self, user_id: str, limit: int) -> Optional[List[Dict]]:
+        return self._query(
+            "SELECT document FROM emails WHERE sender_user_id = ? ORDER BY created_at DESC LIMIT ?",
+            (user_id, limit),
+        )
+
+    def conversation(self, user1_id: str, user2_id: str, limit: int) -> Optional[List[Dict]]:
+        # Duas buscas pelo índice (sender_user_id, created_at) em vez de um OR que varreria a tabela
+        return self._query(
+            "SELECT document FROM ("
+            " SELECT document, created_at FROM emails WHERE sender_user_id = ? AND recipient_user_id = ?"
+            " UNION ALL"
+            " SELECT document, created_at FROM emails WHERE sender_user_id = ? AND recipient_user_id = ?"
+            ") ORDER BY created_at LIMIT ?",
+            (user1_id, user2_id, user2_id, user1_id, limit),
+        )
+
+    def list_emails(self, category: Optional[str], status: Optional[str], limit: int) -> Optional[List[Dict]]:
+        conditions, params = [], []
+        if category:
+            conditions.append("category = ?")
+            params.append(category)
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._query(f"SELECT document FROM emails{where} ORDER BY created_at LIMIT ?", (*params, limit))
+
+    def count(self) -> int:
+        return self._reader().execute("SELECT COUNT(*) FROM emails").fetchone()[0] if self._conn else 0
+
+    def status(self) -> Dict:
+        seconds_since_sync = self._seconds_since_sync() if self._conn else None
+        return {
+            "enabled": self._conn is not None,
+            "fresh": self.fresh,
+            "sync_leader": self._leader_file is not None or (fcntl is None and self._sync_thread is not None),
+            "emails": self.count(),
+            "seconds_since_sync": round(seconds_since_sync, 2) if seconds_since_sync is not None else None,
+            "updated_cursor": self._state("updated_cursor") if self._conn else None,
+            "max_staleness": self.max_staleness,
+        }
+
+
+email_replica = EmailReplica(
+    settings.email_replica_path,
+    sync_interval=settings.email_replica_sync_interval,
+    max_staleness=settings.email_replica_max_staleness,
+    reconcile_interval=settings.email_replica_reconcile_interval,
+    page_size=settings.email_replica_page_size,
+)
+if settings.email_replica_enabled:
+    try:
+        email_replica.open()
+        appwrite_service.add_write_listener(settings.email_collection_id, email_replica)
+    except Exception as e:
+        print(f"❌ Error opening email replica: {e}")
@@ -5,7 +5,10 @@ from appwrite.query import Query
 
 from ..services.appwrite_service import appwrite_service
 from ..services.appwrite_user_service import appwrite_user_service
-from ..services.email_ai_service import email_ai_service
+from ..services.inference_service import inference_service
+from ..services.vector_index import vector_index
+from ..services.event_bus import event_bus
+from ..services.email_replica import email_replica
 from ..config import settings
 
 class EmailUserService:
@@ -19,7 +22,7 @@ class EmailUserService:
             print(f"   Recipient Email: {recipient_email}")
             
             # 1. Buscar usuário destinatário pelo email EXATO
-            recipient_users = appwrite_user_service.list_users(search=recipient_email)
+            recipient_users = await appwrite_user_service.list_users_async(search=recipient_email)
             print(f"   Resultado da busca: {len(recipient_users.get('users', []))} usuários encontrados")
 
             if not recipient_users.get('users') or len(recipient_users['users']) == 0:
@@ -40,7 +43,7 @@ class EmailUserService:
 
             # 2. Verificar se remetente existe
             try:
-                sender_user = appwrite_user_service.get_user(sender_user_id)
+                sender_user = await appwrite_user_service.get_user_async(sender_user_id)
                 sender_email = sender_user.get('email', '')
                 print(f"   Sender encontrado - Email: {sender_email}")
             except Exception as e:
@@ -53,7 +56,7 @@ class EmailUserService:
 
             # 4. Processar email com IA
             print("🤖 Processing email with AI...")
-            ai_result = await email_ai_service.process_email(content=body, subject=subject)
+            ai_result = await inference_service.process_email(content=body, subject=subject)
 
             # 5. Preparar dados do email
             now = datetime.utcnow()
@@ -67,6 +70,7 @@ class EmailUserService:
                 "category": ai_result['category'],
                 "confidence_score": ai_result['confidence_score'],
                 "suggested_response": ai_result['suggested_response'],
+                "model_version": ai_result['model_version'],
                 "status": "processed",
                 "is_read": False,
                 "processed_at": now.isoformat(),
@@ -82,10 +86,12 @@ class EmailUserService:
             print(f"   subject: {email_data['subject']}")
 
             # 6. Salvar no banco
-            result = appwrite_service.create_document(
+            result = await appwrite_service.create_document_async(
                 collection_id=settings.email_collection_id,
                 data=email_data
             )
+            vector_index.index_document(result, ai_result.get('embedding'))
+            event_bus.publish_email_created(result)
 
             print(f"✅ Email enviado com sucesso!")
             print(f"   De: {sender_email} ({sender_user_id})")
@@ -97,38 +103,34 @@ class EmailUserService:
             print(f"❌ Error sending email: {e}")
             raise Exception(f"Error sending email: {str(e)}")
     
-    def get_user_inbox(self, user_id: str, limit: int = 50, include_read: bool = True) -> Dict:
+    async def get_user_inbox(self, user_id: str, limit: int = 50, include_read: bool = True) -> Dict:
         try:
             print(f"📥 Getting inbox for user: {user_id}")
             print(f"   Limit: {limit}, Include Read: {include_read}")
             print(f"   Email Collection ID: {settings.email_collection_id}")
+
+            emails = email_replica.inbox(user_id, limit, include_read)
+            if emails is not None:
+                return self._inbox_result(emails)
             
             queries = [
                 Query.equal("recipient_user_id", user_id),
                 Query.limit(limit),
-                Query.order_desc("$createdAt")
+                Query.order_desc("created_at")
             ]
             if not include_read:
                 queries.append(Query.equal("is_read", False))
 
             print(f"   Queries: {[str(q) for q in queries]}")
 
-            result = appwrite_service.list_documents(
+            result = await appwrite_service.list_documents_async(
                 collection_id=settings.email_collection_id,
                 queries=queries
             )
             
             print(f"   Result: {result}")
             
-            emails = result['documents']
-            total = len(emails)
-            unread_count = len([email for email in emails if not email.get('is_read', False)])
-            
-            return {
-                "total": total,
-                "unread_count": unread_count,
-                "emails": emails
-            }
+            return self._inbox_result(result['documents'])
             
         except Exception as e:
             print(f"❌ Error in get_user_inbox: {e}")
@@ -136,15 +138,27 @@ class EmailUserService:
             print(f"   Collection ID: {settings.email_collection_id}")
             raise Exception(f"Error retrieving inbox for user {user_id}: {e}")
         
-    def get_user_sent(self, user_id: str, limit: int = 50) -> List[Dict]:
+    @staticmethod
+    def _inbox_result(emails: List[Dict]) -> Dict:
+        return {
+            "total": len(emails),
+            "unread_count": len([email for email in emails if not email.get('is_read', False)]),
+            "emails": emails
+        }
+
+    async def get_user_sent(self, user_id: str, limit: int = 50) -> List[Dict]:
         try:
+            emails = email_replica.sent(user_id, limit)
+            if emails is not None:
+                return emails
+
             queries = [
                 Query.equal("sender_user_id", user_id),
                 Query.limit(limit),
-                Query.order_desc("$createdAt")
+                Query.order_desc("created_at")
             ]
             
-            result = appwrite_service.list_documents(
+            result = await appwrite_service.list_documents_async(
                 collection_id=settings.email_collection_id,
                 queries=queries
             )
@@ -153,9 +167,9 @@ class EmailUserService:
         except Exception as e:
             raise Exception(f"Error retrieving sent emails for user {user_id}: {e}")
         
-    def mark_as_read(self, email_id: str, user_id: str) -> Dict:
+    async def mark_as_read(self, email_id: str, user_id: str) -> Dict:
         try:
-            email = appwrite_service.get_document(
+            email = await appwrite_service.get_document_async(
                 collection_id=settings.email_collection_id,
                 document_id=email_id
             )
@@ -163,7 +177,7 @@ class EmailUserService:
             if email.get('recipient_user_id') != user_id:
                 raise PermissionError("User does not have permission to mark this email as read.")
 
-            result = appwrite_service.update_document(
+            result = await appwrite_service.update_document_async(
                 collection_id=settings.email_collection_id,
                 document_id=email_id,
                 data={
@@ -171,13 +185,18 @@ class EmailUserService:
                     "updated_at": datetime.utcnow().isoformat()
                 }
             )
+            event_bus.publish_email_updated(result, fields=("is_read", "$updatedAt"))
             
             return result
         except Exception as e:
             raise Exception(f"Error marking email {email_id} as read for user {user_id}: {e}")
         
-    def get_conversation(self, user1_id: str, user2_id: str, limit: int = 50) -> List[Dict]:
+    async def get_conversation(self, user1_id: str, user2_id: str, limit: int = 50) -> List[Dict]:
         try:
+            emails = email_replica.conversation(user1_id, user2_id, limit)
+            if emails is not None:
+                return emails
+
             queries1 = [
                 Query.equal("sender_user_id", user1_id),
                 Query.equal("recipient_user_id", user2_id),
@@ -188,21 +207,34 @@ class EmailUserService:
                 Query.equal("recipient_user_id", user1_id),
             ]
             
-            result1 = appwrite_service.list_documents(
+            result1 = await appwrite_service.list_documents_async(
                 collection_id=settings.email_collection_id,
                 queries=queries1
             )
 
-            result2 = appwrite_service.list_documents(
+            result2 = await appwrite_service.list_documents_async(
                 collection_id=settings.email_collection_id,
                 queries=queries2
             )
 
             all_emails = result1['documents'] + result2['documents']
-            all_emails.sort(key=lambda x: x.get('$createdAt', x.get('created_at', '')))
+            all_emails.sort(key=lambda x: x.get('created_at') or x.get('$createdAt', ''))
 
             return all_emails[:limit]
         except Exception as e:
             raise Exception(f"Error retrieving conversation between {user1_id} and {user2_id}: {e}")
 
+    async def get_emails_by_ids(self, email_ids: List[str]) -> List[Dict]:
+        if not email_ids:
+            return []
+        try:
+            result = await appwrite_service.list_documents_async(
+                collection_id=settings.email_collection_id,
+                queries=[Query.equal("$id", email_ids), Query.limit(len(email_ids))]
+            )
+            by_id = {email['$id']: email for email in result['documents']}
+            return [by_id[email_id] for email_id in email_ids if email_id in by_id]
+        except Exception as e:
+            raise Exception(f"Error retrieving emails {email_ids}: {e}")
+
 email_user_service = EmailUserService()
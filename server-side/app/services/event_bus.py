@@ -0,0 +1,102 @@
+import asyncio
+import itertools
+import threading
+from typing import AsyncIterator, Dict, Iterable, Optional, Set, Tuple
+
+import orjson
+
+from ..config import settings
+from .metrics import metrics
+
+# Campos do documento que só interessam ao Appwrite
+_INTERNAL_FIELDS = ("$permissions", "$databaseId", "$collectionId")
+EMAIL_UPDATE_FIELDS = ("status", "category", "confidence_score", "suggested_response", "model_version", "is_read", "processed_at", "$updatedAt")
+
+
+class EventBus:
+    """Pub/sub em memória por usuário, consumido pelo endpoint SSE /emails/events/{user_id}.
+
+    Cada conexão tem sua fila limitada; um cliente lento que enche a fila perde os eventos
+    pendentes e recebe um "resync" para refazer o fetch, sem segurar quem publica.
+    """
+
+    def __init__(self, queue_size: int = 100, heartbeat: float = 15.0):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._event_ids = itertools.count(1)
+
+    def _update_gauge(self):
+        metrics.set_gauge("events.subscribers", sum(len(subscribers) for subscribers in self._subscribers.values()))
+
+    def subscribe(self, user_id: str) -> Tuple[asyncio.AbstractEventLoop, asyncio.Queue]:
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.queue_size))
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+            self._update_gauge()
+        return subscriber
+
+    def unsubscribe(self, user_id: str, subscriber: Tuple[asyncio.AbstractEventLoop, asyncio.Queue]):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[user_id]
+            self._update_gauge()
+
+    @staticmethod
+    def _deliver(queue: asyncio.Queue, event: Tuple[str, Dict]):
+        if queue.full():
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(("resync", {}))
+            metrics.increment("events.overflows")
+            return
+        queue.put_nowait(event)
+
+    def publish(self, user_id: Optional[str], event_type: str, data: Dict):
+        if not user_id:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        # Pode ser chamado de threads fora do event loop (reclassificação, importação)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._deliver, queue, (event_type, data))
+        metrics.increment("events.published")
+
+    def publish_email_created(self, document: Dict):
+        data = {key: value for key, value in document.items() if key not in _INTERNAL_FIELDS}
+        for user_id in self._participants(document):
+            self.publish(user_id, "email.created", data)
+
+    def publish_email_updated(self, document: Dict, fields: Iterable[str] = EMAIL_UPDATE_FIELDS):
+        data = {"$id": document["$id"], **{field: document[field] for field in fields if field in document}}
+        for user_id in self._participants(document):
+            self.publish(user_id, "email.updated", data)
+
+    @staticmethod
+    def _participants(document: Dict) -> Set[str]:
+        return {user_id for user_id in (document.get("sender_user_id"), document.get("recipient_user_id")) if user_id}
+
+    async def stream(self, user_id: str) -> AsyncIterator[str]:
+        subscriber = self.subscribe(user_id)
+        _, queue = subscriber
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event_type, data = await asyncio.wait_for(queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    # Comentário SSE mantém a conexão viva através de proxies
+                    yield ": ping\n\n"
+                    continue
+                payload = orjson.dumps(data, default=str).decode("utf-8")
+                yield f"id: {next(self._event_ids)}\nevent: {event_type}\ndata: {payload}\n\n"
+        finally:
+            self.unsubscribe(user_id, subscriber)
+
+
+event_bus = EventBus(queue_size=settings.events_queue_size, heartbeat=settings.events_heartbeat)
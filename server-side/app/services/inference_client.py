@@ -0,0 +1,151 @@
+import asyncio
+import itertools
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+from .email_ai_service import SIMPLE_MODEL_VERSION, email_ai_service
+from .inference_scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE
+from .inference_protocol import (
+    OP_EMBED, OP_EMBED_BULK, OP_ERROR, OP_PROCESS, OP_PROCESS_BULK,
+    decode_embedding, decode_error, decode_result, encode_embed_request,
+    encode_frame, encode_process_request, read_frame,
+)
+
+
+class InferenceUnavailableError(Exception):
+    pass
+
+
+class InferenceClient:
+    """Cliente assíncrono do sidecar de inferência, com a mesma interface de EmailAIService.process_email."""
+
+    def __init__(self, socket_path: str, timeout: float = 30.0, reconnect_delay: float = 5.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._request_ids = itertools.count(1)
+        self._retry_after = 0.0
+
+    async def _ensure_connection(self) -> asyncio.StreamWriter:
+        writer = self._writer
+        if writer is not None and not writer.is_closing():
+            return writer
+        if time.monotonic() < self._retry_after:
+            raise InferenceUnavailableError("Inference sidecar recently unreachable")
+
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+
+        async with self._connect_lock:
+            writer = self._writer
+            if writer is not None and not writer.is_closing():
+                return writer
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_unix_connection(self.socket_path), timeout=self.timeout
+                )
+            except (OSError, asyncio.TimeoutError) as e:
+                self._retry_after = time.monotonic() + self.reconnect_delay
+                raise InferenceUnavailableError(f"Cannot connect to inference sidecar: {e}")
+            self._reader, self._writer = reader, writer
+            self._reader_task = asyncio.create_task(self._read_responses(reader))
+            print(f"🔌 Connected to inference sidecar at {self.socket_path}")
+            return writer
+
+    async def _read_responses(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                op, request_id, payload = await read_frame(reader)
+                future = self._pending.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if op == OP_ERROR:
+                    future.set_exception(InferenceUnavailableError(decode_error(payload)))
+                else:
+                    future.set_result((op, payload))
+        except Exception as e:
+            print(f"⚠️ Inference sidecar connection lost: {e}")
+        finally:
+            # Um leitor de uma conexão antiga não derruba a que já a substituiu
+            if reader is self._reader:
+                self._reset_connection(InferenceUnavailableError("Inference sidecar connection lost"))
+
+    def _reset_connection(self, error: Exception):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+        self._retry_after = time.monotonic() + self.reconnect_delay
+
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def _request(self, op: int, payload: bytes) -> Tuple[int, bytes]:
+        # Referência local: outra requisição pode derrubar a conexão (_reset_connection) no meio desta
+        writer = await self._ensure_connection()
+
+        request_id = next(self._request_ids) & 0xFFFFFFFF
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+
+        try:
+            if writer.is_closing() or self._writer is not writer:
+                raise InferenceUnavailableError("Inference sidecar connection lost")
+            writer.write(encode_frame(op, request_id, payload))
+            await writer.drain()
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        except (OSError, AttributeError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+            raise InferenceUnavailableError(f"Inference sidecar request failed: {e}")
+        finally:
+            self._pending.pop(request_id, None)
+
+    def _fallback(self, content: str, subject: str) -> Dict:
+        start_time = time.time()
+        clean_content = email_ai_service.preprocess_text(content)
+        clean_subject = email_ai_service.preprocess_text(subject) if subject else ""
+        category, confidence, suggested_response = email_ai_service.classify_email_simple(clean_content, clean_subject)
+
+        return {
+            "category": category,
+            "confidence_score": float(confidence),
+            "suggested_response": suggested_response,
+            "processing_time": float(time.time() - start_time),
+            "embedding": None,
+            "model_version": SIMPLE_MODEL_VERSION,
+        }
+
+    async def process_email(self, content: str, subject: str = "", priority: str = PRIORITY_INTERACTIVE) -> Dict:
+        op = OP_PROCESS_BULK if priority == PRIORITY_BULK else OP_PROCESS
+        try:
+            _, payload = await self._request(op, encode_process_request(content, subject))
+            return decode_result(payload)
+        except InferenceUnavailableError as e:
+            print(f"⚠️ {e} - falling back to simple classification")
+            return self._fallback(content, subject)
+
+    async def embed_text(self, text: str, priority: str = PRIORITY_INTERACTIVE) -> Optional[np.ndarray]:
+        op = OP_EMBED_BULK if priority == PRIORITY_BULK else OP_EMBED
+        try:
+            _, payload = await self._request(op, encode_embed_request(text))
+            return decode_embedding(payload)
+        except InferenceUnavailableError as e:
+            print(f"⚠️ {e} - embedding unavailable")
+            return None
+
+
+inference_client = InferenceClient(
+    settings.inference_socket_path,
+    timeout=settings.inference_timeout,
+    reconnect_delay=settings.inference_reconnect_delay,
+)
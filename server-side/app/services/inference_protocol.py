@@ -0,0 +1,137 @@
+import asyncio
+import struct
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Frame: versão (u8) | operação (u8) | request id (u32) | tamanho do payload (u32) | payload
+# 2: OP_RESULT passou a levar o embedding e o model_version; OP_EMBED_BULK
+PROTOCOL_VERSION = 2
+HEADER = struct.Struct("!BBII")
+MAX_PAYLOAD_SIZE = 8 * 1024 * 1024
+
+OP_PROCESS = 1
+OP_RESULT = 2
+OP_ERROR = 3
+OP_EMBED = 4
+OP_EMBEDDING = 5
+OP_PROCESS_BULK = 6  # mesmo payload de OP_PROCESS, faixa de lote do scheduler
+OP_EMBED_BULK = 7  # mesmo payload de OP_EMBED, faixa de lote do scheduler
+
+_STR_LEN = struct.Struct("!I")
+_RESULT_SCORES = struct.Struct("!dd")
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def _pack_str(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return _STR_LEN.pack(len(data)) + data
+
+
+def _unpack_str(payload: bytes, offset: int) -> Tuple[str, int]:
+    (length,) = _STR_LEN.unpack_from(payload, offset)
+    offset += _STR_LEN.size
+    end = offset + length
+    if end > len(payload):
+        raise ProtocolError("Truncated string in payload")
+    return payload[offset:end].decode("utf-8"), end
+
+
+def _pack_vector(vector: Optional[np.ndarray]) -> bytes:
+    data = b"" if vector is None else np.asarray(vector, dtype="<f4").tobytes()
+    return _STR_LEN.pack(len(data)) + data
+
+
+def _unpack_vector(payload: bytes, offset: int) -> Tuple[Optional[np.ndarray], int]:
+    (length,) = _STR_LEN.unpack_from(payload, offset)
+    offset += _STR_LEN.size
+    end = offset + length
+    if end > len(payload):
+        raise ProtocolError("Truncated vector in payload")
+    if not length:
+        return None, end
+    return np.frombuffer(payload[offset:end], dtype="<f4").astype(np.float32), end
+
+
+def encode_frame(op: int, request_id: int, payload: bytes) -> bytes:
+    if len(payload) > MAX_PAYLOAD_SIZE:
+        raise ProtocolError(f"Payload too large: {len(payload)} bytes")
+    return HEADER.pack(PROTOCOL_VERSION, op, request_id, len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+    header = await reader.readexactly(HEADER.size)
+    version, op, request_id, length = HEADER.unpack(header)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version: {version}")
+    if length > MAX_PAYLOAD_SIZE:
+        raise ProtocolError(f"Payload too large: {length} bytes")
+    payload = await reader.readexactly(length) if length else b""
+    return op, request_id, payload
+
+
+def encode_process_request(content: str, subject: str) -> bytes:
+    return _pack_str(subject) + _pack_str(content)
+
+
+def decode_process_request(payload: bytes) -> Tuple[str, str]:
+    subject, offset = _unpack_str(payload, 0)
+    content, _ = _unpack_str(payload, offset)
+    return content, subject
+
+
+def encode_result(result: Dict) -> bytes:
+    return (
+        _pack_str(result["category"])
+        + _RESULT_SCORES.pack(float(result["confidence_score"]), float(result["processing_time"]))
+        + _pack_str(result["suggested_response"])
+        + _pack_vector(result.get("embedding"))
+        + _pack_str(result.get("model_version", ""))
+    )
+
+
+def decode_result(payload: bytes) -> Dict:
+    category, offset = _unpack_str(payload, 0)
+    confidence, processing_time = _RESULT_SCORES.unpack_from(payload, offset)
+    offset += _RESULT_SCORES.size
+    suggested_response, offset = _unpack_str(payload, offset)
+    embedding, offset = _unpack_vector(payload, offset)
+    model_version, _ = _unpack_str(payload, offset)
+    return {
+        "category": category,
+        "confidence_score": confidence,
+        "suggested_response": suggested_response,
+        "processing_time": processing_time,
+        "embedding": embedding,
+        "model_version": model_version,
+    }
+
+
+def encode_embed_request(text: str) -> bytes:
+    return _pack_str(text)
+
+
+def decode_embed_request(payload: bytes) -> str:
+    text, _ = _unpack_str(payload, 0)
+    return text
+
+
+def encode_embedding(vector: Optional[np.ndarray]) -> bytes:
+    return _pack_vector(vector)
+
+
+def decode_embedding(payload: bytes) -> Optional[np.ndarray]:
+    vector, _ = _unpack_vector(payload, 0)
+    return vector
+
+
+def encode_error(message: str) -> bytes:
+    return _pack_str(message)
+
+
+def decode_error(payload: bytes) -> str:
+    message, _ = _unpack_str(payload, 0)
+    return message
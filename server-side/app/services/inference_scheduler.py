@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Dict, List, Tuple
+
+from ..config import settings
+from .metrics import metrics
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BULK = "bulk"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BULK)
+
+
+class InferenceScheduler:
+    """Fila de inferência com duas faixas de prioridade servida por threads dedicadas.
+
+    Requisições interativas (envio, process-text) sempre passam na frente das de lote
+    (reclassificação, importações). Para que o lote não morra de fome sob carga contínua,
+    quando a faixa de lote fica bulk_max_wait segundos sem ser atendida, um item dela
+    passa na frente; a janela recomeça a cada item de lote atendido.
+
+    Um item não é interrompido depois de começar, então lotes grandes entram pelos métodos
+    *_chunked, que os quebram em itens de até bulk_chunk_size emails.
+    """
+
+    def __init__(self, workers: int = 1, bulk_max_wait: float = 5.0, bulk_chunk_size: int = 8):
+        self.workers = max(1, workers)
+        self.bulk_max_wait = bulk_max_wait
+        self.bulk_chunk_size = max(1, bulk_chunk_size)
+
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[Tuple[float, Future, Callable, tuple]]] = {priority: deque() for priority in PRIORITIES}
+        self._threads: List[threading.Thread] = []
+        self._last_bulk = time.monotonic()
+
+    def _ensure_workers(self):
+        # Threads só sobem no primeiro uso: a API em modo sidecar nunca as cria
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"inference-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _update_depth(self):
+        for priority, queue in self._queues.items():
+            metrics.set_gauge(f"inference.queue_depth.{priority}", len(queue))
+
+    def submit(self, fn: Callable, *args, priority: str = PRIORITY_INTERACTIVE) -> Future:
+        if priority not in self._queues:
+            raise ValueError(f"Unknown inference priority: {priority}")
+
+        future = Future()
+        with self._cond:
+            self._ensure_workers()
+            self._queues[priority].append((time.monotonic(), future, fn, args))
+            self._update_depth()
+            self._cond.notify()
+        return future
+
+    def run(self, fn: Callable, *args, priority: str = PRIORITY_INTERACTIVE):
+        return self.submit(fn, *args, priority=priority).result()
+
+    async def run_async(self, fn: Callable, *args, priority: str = PRIORITY_INTERACTIVE):
+        return await asyncio.wrap_future(self.submit(fn, *args, priority=priority))
+
+    def submit_chunked(self, fn: Callable[[List], List], items: List, priority: str = PRIORITY_BULK) -> List[Future]:
+        """Enfileira fn sobre pedaços de items; entre um pedaço e outro o interativo passa na frente."""
+        size = self.bulk_chunk_size
+        return [self.submit(fn, items[start:start + size], priority=priority) for start in range(0, len(items), size)]
+
+    def run_chunked(self, fn: Callable[[List], List], items: List, priority: str = PRIORITY_BULK) -> List:
+        results = []
+        for future in self.submit_chunked(fn, items, priority=priority):
+            results.extend(future.result())
+        return results
+
+    async def run_chunked_async(self, fn: Callable[[List], List], items: List, priority: str = PRIORITY_BULK) -> List:
+        chunks = await asyncio.gather(*(asyncio.wrap_future(future) for future in self.submit_chunked(fn, items, priority=priority)))
+        return [result for chunk in chunks for result in chunk]
+
+    def _next_lane(self) -> str:
+        interactive, bulk = self._queues[PRIORITY_INTERACTIVE], self._queues[PRIORITY_BULK]
+        if not bulk:
+            return PRIORITY_INTERACTIVE
+        if not interactive:
+            return PRIORITY_BULK
+        if time.monotonic() - max(bulk[0][0], self._last_bulk) >= self.bulk_max_wait:
+            metrics.increment("inference.bulk_promoted")
+            return PRIORITY_BULK
+        return PRIORITY_INTERACTIVE
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not any(self._queues.values()):
+                    self._cond.wait()
+                priority = self._next_lane()
+                enqueued_at, future, fn, args = self._queues[priority].popleft()
+                if priority == PRIORITY_BULK:
+                    self._last_bulk = time.monotonic()
+                self._update_depth()
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            metrics.observe(f"inference.queue_wait.{priority}", time.monotonic() - enqueued_at)
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+inference_scheduler = InferenceScheduler(
+    workers=settings.inference_workers,
+    bulk_max_wait=settings.inference_bulk_max_wait,
+    bulk_chunk_size=settings.inference_bulk_chunk_size,
+)
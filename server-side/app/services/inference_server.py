@@ -0,0 +1,84 @@
+import asyncio
+import os
+
+from ..config import settings
+from .email_ai_service import email_ai_service
+from .inference_scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, inference_scheduler
+from .inference_protocol import (
+    OP_EMBED, OP_EMBED_BULK, OP_EMBEDDING, OP_ERROR, OP_PROCESS, OP_PROCESS_BULK, OP_RESULT, ProtocolError,
+    decode_embed_request, decode_process_request, encode_embedding, encode_error,
+    encode_frame, encode_result, read_frame,
+)
+
+
+class InferenceServer:
+    """Processo de inferência de longa duração servindo EmailAIService via Unix socket."""
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        # Reaproveita a instância do módulo: uma segunda cópia carregaria os modelos de novo
+        self.service = email_ai_service
+        self.service.ensure_models()
+
+    async def _handle_request(self, op: int, request_id: int, payload: bytes, writer: asyncio.StreamWriter, write_lock: asyncio.Lock):
+        try:
+            if op in (OP_EMBED, OP_EMBED_BULK):
+                text = decode_embed_request(payload)
+                priority = PRIORITY_BULK if op == OP_EMBED_BULK else PRIORITY_INTERACTIVE
+                vector = await inference_scheduler.run_async(self.service.embed_text_sync, text, priority=priority)
+                frame = encode_frame(OP_EMBEDDING, request_id, encode_embedding(vector))
+            else:
+                content, subject = decode_process_request(payload)
+                priority = PRIORITY_BULK if op == OP_PROCESS_BULK else PRIORITY_INTERACTIVE
+                result = await inference_scheduler.run_async(self.service.process_email_sync, content, subject, priority=priority)
+                frame = encode_frame(OP_RESULT, request_id, encode_result(result))
+        except Exception as e:
+            print(f"❌ Inference request {request_id} failed: {e}")
+            frame = encode_frame(OP_ERROR, request_id, encode_error(str(e)))
+
+        async with write_lock:
+            writer.write(frame)
+            await writer.drain()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            # Pipelining: cada frame vira uma task, respostas saem na ordem em que terminam
+            while True:
+                op, request_id, payload = await read_frame(reader)
+                if op not in (OP_PROCESS, OP_PROCESS_BULK, OP_EMBED, OP_EMBED_BULK):
+                    raise ProtocolError(f"Unexpected operation: {op}")
+                task = asyncio.create_task(self._handle_request(op, request_id, payload, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except asyncio.IncompleteReadError:
+            pass
+        except (ProtocolError, ConnectionError) as e:
+            print(f"⚠️ Closing inference connection: {e}")
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+    async def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        print(f"🚀 Inference server listening on {self.socket_path}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    server = InferenceServer(settings.inference_socket_path)
+    try:
+        asyncio.run(server.serve_forever())
+    finally:
+        if os.path.exists(server.socket_path):
+            os.unlink(server.socket_path)
+
+
+if __name__ == "__main__":
+    main()
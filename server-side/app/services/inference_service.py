@@ -0,0 +1,8 @@
+from ..config import settings
+from .email_ai_service import email_ai_service
+
+# Ponto único usado pelas rotas: modelos no próprio processo ou no sidecar de inferência
+if settings.inference_backend == "sidecar":
+    from .inference_client import inference_client as inference_service
+else:
+    inference_service = email_ai_service
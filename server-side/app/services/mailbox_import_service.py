@@ -0,0 +1,349 @@
+import asyncio
+import hashlib
+import html
+import os
+import re
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesFeedParser, BytesParser
+from email.utils import parseaddr, parsedate_to_datetime
+from html.parser import HTMLParser
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ..config import settings
+from ..models.email import EmailStatus
+from .appwrite_service import appwrite_service
+from .email_ai_service import EmailAIService
+from .event_bus import event_bus
+from .inference_scheduler import PRIORITY_BULK, inference_scheduler
+from .inference_service import inference_service
+from .metrics import metrics
+from .vector_index import vector_index
+
+# Remetentes externos não são usuários do Appwrite: o id fica por destinatário para não juntar as
+# importações de todos os usuários na mesma partição do índice vetorial e na mesma versão de caixa
+IMPORTED_SENDER_PREFIX = "external"
+
+
+def imported_sender_id(user_id: str) -> str:
+    return f"{IMPORTED_SENDER_PREFIX}:{user_id}"
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip += 1
+        elif tag in ("br", "p", "div", "tr", "li"):
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def _html_to_text(markup: str) -> str:
+    extractor = _TextExtractor()
+    extractor.feed(markup)
+    extractor.close()
+    return html.unescape("".join(extractor.parts))
+
+
+def _normalize_text(text: str) -> str:
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = re.sub(r"[ \t\xa0]+", " ", text)
+    text = re.sub(r"\n\s*\n+", "\n\n", text)
+    return text.strip()
+
+
+def extract_body(message: EmailMessage) -> str:
+    """Texto do email: prefere text/plain, cai para text/html sem as tags."""
+    part = message.get_body(preferencelist=("plain", "html"))
+    if part is None:
+        return ""
+    try:
+        content = part.get_content()
+    except (LookupError, UnicodeDecodeError):
+        # Charset desconhecido ou errado no cabeçalho
+        content = part.get_payload(decode=True).decode("utf-8", errors="replace")
+    if part.get_content_subtype() == "html":
+        content = _html_to_text(content)
+    return _normalize_text(content)
+
+
+def iter_mbox(fileobj) -> Iterator[EmailMessage]:
+    """Divide um mbox nas linhas "From " e alimenta um parser incremental por mensagem."""
+    parser: Optional[BytesFeedParser] = None
+    previous_blank = True
+    for line in fileobj:
+        if line.startswith(b"From ") and previous_blank:
+            if parser is not None:
+                yield parser.close()
+            parser = BytesFeedParser(policy=policy.default)
+        elif parser is not None:
+            # mboxrd: ">From " escapado no corpo
+            parser.feed(line[1:] if re.match(rb">+From ", line) else line)
+        previous_blank = line in (b"\n", b"\r\n")
+    if parser is not None:
+        yield parser.close()
+
+
+def iter_eml_zip(path: str) -> Iterator[EmailMessage]:
+    parser = BytesParser(policy=policy.default)
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(".eml"):
+                continue
+            with archive.open(info) as member:
+                yield parser.parse(member)
+
+
+def iter_archive(path: str) -> Iterator[EmailMessage]:
+    if zipfile.is_zipfile(path):
+        yield from iter_eml_zip(path)
+        return
+    with open(path, "rb") as f:
+        yield from iter_mbox(f)
+
+
+class MailboxImportJob:
+    """Importa um mbox ou zip de .eml para a caixa de entrada de um usuário numa única passada.
+
+    As mensagens são lidas uma a uma, classificadas em lotes na faixa de lote do scheduler
+    e gravadas no Appwrite com no máximo concurrency escritas em voo, então a memória não
+    depende do tamanho do arquivo. O id do documento deriva do Message-ID, então importar
+    o mesmo arquivo de novo (ou retomar depois de uma queda) não duplica emails.
+    """
+
+    def __init__(self, service: EmailAIService, path: str, user_id: str, recipient_email: str,
+                 batch_size: int = 64, concurrency: int = 8, delete_after: bool = False):
+        self.id = uuid.uuid4().hex
+        self.service = service
+        self.path = path
+        self.user_id = user_id
+        self.recipient_email = recipient_email
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.delete_after = delete_after
+
+        self._started = 0.0
+        self._state = {
+            "job_id": self.id,
+            "user_id": user_id,
+            "status": "pending",
+            "parsed": 0,
+            "imported": 0,
+            "duplicates": 0,
+            "failed": 0,
+            "messages_per_second": 0.0,
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+        }
+
+    def status(self) -> Dict:
+        return dict(self._state)
+
+    def _document_id(self, message: EmailMessage, subject: str, body: str) -> str:
+        key = str(message.get("message-id") or "").strip()
+        if not key:
+            key = "\0".join([subject, str(message.get("date") or ""), str(message.get("from") or ""), body[:1000]])
+        return "imp" + hashlib.sha1(f"{self.user_id}:{key}".encode("utf-8", errors="replace")).hexdigest()[:32]
+
+    def _parse(self, message: EmailMessage) -> Dict:
+        subject = _normalize_text(str(message.get("subject") or ""))
+        body = extract_body(message)
+        sender = parseaddr(str(message.get("from") or ""))[1]
+        # Data original do email (header Date), em UTC: inbox e enviados ordenam por created_at
+        try:
+            sent_at = parsedate_to_datetime(str(message.get("date")))
+            if sent_at.tzinfo is not None:
+                sent_at = sent_at.astimezone(timezone.utc).replace(tzinfo=None)
+            created_at = sent_at.isoformat()
+        except (TypeError, ValueError):
+            created_at = datetime.utcnow().isoformat()
+        return {
+            "document_id": self._document_id(message, subject, body),
+            "subject": subject,
+            "body": body,
+            "sender": sender,
+            "created_at": created_at,
+        }
+
+    def _next_batch(self, messages: Iterator[EmailMessage]) -> Tuple[List[Dict], int]:
+        batch, unparseable = [], 0
+        for message in messages:
+            try:
+                batch.append(self._parse(message))
+            except Exception as e:
+                print(f"⚠️ Skipping unparseable message: {e}")
+                unparseable += 1
+            if len(batch) >= self.batch_size:
+                break
+        return batch, unparseable
+
+    async def _classify(self, batch: List[Dict]) -> List[Dict]:
+        pairs = [(item["body"], item["subject"]) for item in batch]
+        if self.service.has_models:
+            return await inference_scheduler.run_chunked_async(self.service.process_emails_batch_sync, pairs, priority=PRIORITY_BULK)
+        # API em modo sidecar: os modelos estão no outro processo
+        return await asyncio.gather(*(inference_service.process_email(content, subject, priority=PRIORITY_BULK) for content, subject in pairs))
+
+    def _write(self, item: Dict, ai_result: Dict) -> str:
+        now = datetime.utcnow().isoformat()
+        try:
+            result = appwrite_service.create_document(
+                collection_id=settings.email_collection_id,
+                document_id=item["document_id"],
+                data={
+                    "subject": item["subject"],
+                    "body": item["body"],
+                    "sender": item["sender"],
+                    "sender_user_id": imported_sender_id(self.user_id),
+                    "recipient": self.recipient_email,
+                    "recipient_user_id": self.user_id,
+                    "category": ai_result["category"],
+                    "confidence_score": ai_result["confidence_score"],
+                    "suggested_response": ai_result["suggested_response"],
+                    "model_version": ai_result["model_version"],
+                    "status": EmailStatus.PROCESSED.value,
+                    "is_read": True,
+                    "processed_at": now,
+                    "created_at": item["created_at"],
+                    "updated_at": now,
+                }
+            )
+        except Exception as e:
+            # Uma mensagem com problema (ex.: atributo rejeitado pelo Appwrite) não derruba a importação
+            if getattr(e, "code", None) == 409:
+                return "duplicates"
+            print(f"❌ Error importing message {item['document_id']}: {e}")
+            return "failed"
+        vector_index.index_document(result, ai_result.get("embedding"))
+        return "imported"
+
+    def _record(self, outcome: str):
+        self._state[outcome] += 1
+        metrics.increment(f"mailbox_import.{outcome}")
+
+    async def run(self) -> Dict:
+        loop = asyncio.get_running_loop()
+        self._state["status"] = "running"
+        self._state["started_at"] = datetime.utcnow().isoformat()
+        self._started = time.monotonic()
+        print(f"📥 Importing {self.path} into the inbox of {self.user_id}")
+
+        slots = asyncio.Semaphore(self.concurrency)
+        writes = set()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="mailbox-import")
+
+        async def write(item: Dict, ai_result: Dict):
+            try:
+                self._record(await loop.run_in_executor(executor, self._write, item, ai_result))
+            finally:
+                slots.release()
+
+        try:
+            messages = iter_archive(self.path)
+            while True:
+                # Parsing fora do event loop; um lote por vez mantém a memória constante
+                batch, unparseable = await asyncio.to_thread(self._next_batch, messages)
+                for _ in range(unparseable):
+                    self._record("failed")
+                if not batch:
+                    if unparseable:
+                        continue
+                    break
+                self._state["parsed"] += len(batch)
+
+                for item, ai_result in zip(batch, await self._classify(batch)):
+                    await slots.acquire()
+                    task = asyncio.create_task(write(item, ai_result))
+                    writes.add(task)
+                    task.add_done_callback(writes.discard)
+
+                elapsed = time.monotonic() - self._started
+                self._state["messages_per_second"] = round(self._state["parsed"] / elapsed, 2) if elapsed > 0 else 0.0
+                state = self._state
+                print(f"   {state['parsed']} parsed | {state['imported']} imported | {state['duplicates']} duplicates | "
+                      f"{state['failed']} failed | {state['messages_per_second']} msgs/s")
+
+            if writes:
+                await asyncio.gather(*writes)
+            self._state["status"] = "completed"
+        except Exception as e:
+            print(f"❌ Mailbox import failed: {e}")
+            self._state["status"] = "failed"
+            self._state["error"] = str(e)
+        finally:
+            if writes:
+                await asyncio.gather(*writes, return_exceptions=True)
+            executor.shutdown(wait=False)
+            self._state["finished_at"] = datetime.utcnow().isoformat()
+            if self.delete_after and os.path.exists(self.path):
+                os.remove(self.path)
+
+        # A caixa mudou em massa: clientes conectados refazem o fetch em vez de receber um evento por email
+        event_bus.publish(self.user_id, "resync", {})
+        state = self.status()
+        print(f"✅ Mailbox import {state['status']}: {state['imported']} imported, {state['duplicates']} duplicates, "
+              f"{state['failed']} failed ({state['messages_per_second']} msgs/s)")
+        return state
+
+
+class MailboxImportService:
+    """Jobs de importação disparados pela API, rodando como tasks no event loop."""
+
+    def __init__(self, max_finished_jobs: int = 100):
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs: "OrderedDict[str, MailboxImportJob]" = OrderedDict()
+        self._tasks = set()
+
+    def start(self, job: MailboxImportJob) -> Dict:
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_finished_jobs:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.status()["status"] in ("pending", "running"):
+                break
+            self._jobs.popitem(last=False)
+
+        task = asyncio.create_task(job.run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job.status()
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        job = self._jobs.get(job_id)
+        return job.status() if job else None
+
+
+async def save_upload(upload, directory: str, chunk_size: int = 1024 * 1024) -> Tuple[str, int]:
+    """Copia o upload para disco em blocos (o arquivo nunca fica inteiro em memória)."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{uuid.uuid4().hex}.upload")
+    size = 0
+    with open(path, "wb") as f:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            f.write(chunk)
+            size += len(chunk)
+    return path, size
+
+
+mailbox_import_service = MailboxImportService()
@@ -0,0 +1,81 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from ..config import settings
+
+USERS_KEY = "users"
+
+
+def documents_etag(documents: Iterable[Dict], *params) -> str:
+    """ETag fraco a partir de ($id, $updatedAt) de cada documento e dos parâmetros da consulta."""
+    digest = hashlib.blake2b(repr(params).encode("utf-8"), digest_size=12)
+    for document in documents:
+        digest.update(f"{document.get('$id')}@{document.get('$updatedAt')};".encode("utf-8"))
+    return f'W/"{digest.hexdigest()}"'
+
+
+class MailboxVersions:
+    """Contadores de versão por caixa (usuário) para responder If-None-Match sem ler o Appwrite.
+
+    Toda escrita feita por este processo incrementa a versão dos participantes do email.
+    Uma leitura guarda o ETag calculado junto com a versão vista antes de ler; enquanto a
+    versão não muda e o ETag tem menos de trust_seconds, um If-None-Match igual vira 304
+    direto. Escritas que não passam por aqui (outro worker, scripts, console do Appwrite)
+    aparecem no máximo trust_seconds depois, quando o ETag volta a ser recalculado.
+    """
+
+    def __init__(self, trust_seconds: float = 5.0, max_entries: int = 10000):
+        self.trust_seconds = trust_seconds
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        # Reinício do processo invalida todos os ETags guardados em memória
+        self._epoch = uuid.uuid4().hex[:8]
+        self._global = 0
+        self._versions: Dict[str, int] = {}
+        self._etags: "OrderedDict[Tuple[str, tuple], Tuple[Tuple[str, int, int], str, float]]" = OrderedDict()
+
+    def version(self, key: str) -> Tuple[str, int, int]:
+        with self._lock:
+            return self._epoch, self._global, self._versions.get(key, 0)
+
+    def bump(self, *keys: Optional[str]):
+        with self._lock:
+            for key in keys:
+                if key:
+                    self._versions[key] = self._versions.get(key, 0) + 1
+
+    def bump_document(self, document: Dict):
+        self.bump(document.get("sender_user_id"), document.get("recipient_user_id"))
+
+    def bump_all(self):
+        # Sem saber quem foi afetado (ex.: delete só com o id), invalida todas as caixas
+        with self._lock:
+            self._global += 1
+
+    def remember(self, key: str, params: tuple, version: Tuple[str, int, int], etag: str):
+        with self._lock:
+            self._etags[(key, params)] = (version, etag, time.monotonic())
+            self._etags.move_to_end((key, params))
+            while len(self._etags) > self.max_entries:
+                self._etags.popitem(last=False)
+
+    def cached_etag(self, key: str, params: tuple) -> Optional[str]:
+        if self.trust_seconds <= 0:
+            return None
+        with self._lock:
+            entry = self._etags.get((key, params))
+            if entry is None:
+                return None
+            version, etag, computed_at = entry
+            current = (self._epoch, self._global, self._versions.get(key, 0))
+            if version != current or time.monotonic() - computed_at > self.trust_seconds:
+                return None
+        return etag
+
+
+mailbox_versions = MailboxVersions(trust_seconds=settings.etag_trust_seconds)
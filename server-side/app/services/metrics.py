@@ -0,0 +1,48 @@
+import threading
+from typing import Dict
+
+
+class MetricsRegistry:
+    """Métricas em memória do processo: contadores, gauges e resumos (count/sum/max)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._summaries: Dict[str, Dict[str, float]] = {}
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                summary = self._summaries[name] = {"count": 0, "sum": 0.0, "max": value}
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            summaries = {
+                name: {**summary, "avg": summary["sum"] / summary["count"] if summary["count"] else 0.0}
+                for name, summary in self._summaries.items()
+            }
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "summaries": summaries,
+            }
+
+
+metrics = MetricsRegistry()
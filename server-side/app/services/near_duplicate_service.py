@@ -0,0 +1,102 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+_HASH_MASK = np.uint64(0xFFFFFFFF)
+
+
+class NearDuplicateIndex:
+    """MinHash + LSH por bandas sobre as palavras do texto pré-processado dos emails.
+
+    Cada email vira uma assinatura de num_perm mínimos; emails com Jaccard alto colidem
+    em ao menos uma banda com alta probabilidade, e só esses candidatos são comparados.
+    Um candidato só é reaproveitado se a similaridade estimada passar do threshold.
+    """
+
+    def __init__(self, threshold: float = 0.8, capacity: int = 50_000, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+
+        self.threshold = threshold
+        self.capacity = capacity
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[bytes, Tuple[np.ndarray, Dict]]" = OrderedDict()
+        self._buckets: List[Dict[bytes, set]] = [{} for _ in range(bands)]
+
+    def signature(self, text: str) -> np.ndarray:
+        tokens = set(re.findall(r"\w+", text.lower())) or {text}
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little") for token in tokens),
+            dtype=np.uint64,
+            count=len(tokens),
+        ) & _HASH_MASK
+        # (a * h + b) mod p cabe em uint64 porque a < 2^31 e h < 2^32
+        return ((hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME).min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def lookup(self, text: str) -> Optional[Tuple[Dict, float]]:
+        signature = self.signature(text)
+        with self._lock:
+            candidates = set()
+            for band, key in enumerate(self._band_keys(signature)):
+                candidates.update(self._buckets[band].get(key, ()))
+
+            best_key, best_similarity = None, 0.0
+            for candidate in candidates:
+                similarity = float(np.mean(self._entries[candidate][0] == signature))
+                if similarity > best_similarity:
+                    best_key, best_similarity = candidate, similarity
+
+            if best_key is None or best_similarity < self.threshold:
+                return None
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key][1], best_similarity
+
+    def add(self, text: str, result: Dict):
+        signature = self.signature(text)
+        entry_key = signature.tobytes()
+        with self._lock:
+            if entry_key not in self._entries:
+                for band, key in enumerate(self._band_keys(signature)):
+                    self._buckets[band].setdefault(key, set()).add(entry_key)
+            self._entries[entry_key] = (signature, result)
+            self._entries.move_to_end(entry_key)
+
+            while len(self._entries) > self.capacity:
+                evicted_key, (evicted_signature, _) = self._entries.popitem(last=False)
+                for band, key in enumerate(self._band_keys(evicted_signature)):
+                    bucket = self._buckets[band].get(key)
+                    if bucket is not None:
+                        bucket.discard(evicted_key)
+                        if not bucket:
+                            del self._buckets[band][key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets = [{} for _ in range(self.bands)]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+near_duplicate_index = NearDuplicateIndex(
+    threshold=settings.near_duplicate_threshold,
+    capacity=settings.near_duplicate_capacity,
+)
@@ -0,0 +1,224 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from ..config import settings
+from ..models.email import CategorySource, EmailStatus
+from .appwrite_service import appwrite_service
+from .email_ai_service import EmailAIService, email_ai_service
+from .metrics import metrics
+from .vector_index import vector_index
+
+
+class ReclassificationJob:
+    """Reclassifica toda a coleção de emails com a versão atual dos modelos.
+
+    Percorre a coleção por cursor, classifica em lotes, grava as atualizações em paralelo
+    (limitado por concurrency) e salva o cursor após cada página, então pode ser retomado
+    depois de uma queda. Documentos já marcados com a versão atual e categorias corrigidas
+    por usuários (category_source="user") são pulados.
+    """
+
+    def __init__(self, service: EmailAIService, checkpoint_path: str, batch_size: int = 64, concurrency: int = 8, page_size: int = 500):
+        self.service = service
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.page_size = page_size
+
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._cancel = threading.Event()
+        self._state = self._empty_state()
+        self._run_started = 0.0
+        self._run_start_processed = 0
+
+    def _empty_state(self) -> Dict:
+        return {
+            "status": "idle",
+            "model_version": self.service.model_version,
+            "cursor": None,
+            "processed": 0,
+            "updated": 0,
+            "skipped": 0,
+            "failed": 0,
+            "started_at": None,
+            "finished_at": None,
+            "docs_per_second": 0.0,
+            "error": None,
+        }
+
+    def status(self) -> Dict:
+        with self._lock:
+            return dict(self._state)
+
+    def _load_checkpoint(self) -> Optional[Dict]:
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        # Checkpoint de outra versão dos modelos não serve: recomeça do início
+        if checkpoint.get("model_version") != self.service.model_version:
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self):
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.status(), f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _update_document(self, document: Dict, ai_result: Dict) -> str:
+        now = datetime.utcnow().isoformat()
+        try:
+            # A página foi lida antes da inferência: uma correção do usuário nesse intervalo não é sobrescrita
+            current = appwrite_service.get_document(
+                collection_id=settings.email_collection_id,
+                document_id=document['$id']
+            )
+            if (current.get("category_source") == CategorySource.USER.value
+                    or current.get("$updatedAt") != document.get("$updatedAt")):
+                return "skipped"
+
+            result = appwrite_service.update_document(
+                collection_id=settings.email_collection_id,
+                document_id=document['$id'],
+                data={
+                    "category": ai_result["category"],
+                    "confidence_score": ai_result["confidence_score"],
+                    "suggested_response": ai_result["suggested_response"],
+                    "model_version": ai_result["model_version"],
+                    "category_source": CategorySource.MODEL.value,
+                    "status": EmailStatus.PROCESSED.value,
+                    "processed_at": now,
+                    "updated_at": now,
+                }
+            )
+            vector_index.index_document(result, ai_result.get("embedding"))
+            return "updated"
+        except Exception as e:
+            print(f"❌ Error updating email {document['$id']}: {e}")
+            return "failed"
+
+    def _process_page(self, page: List[Dict], executor: ThreadPoolExecutor):
+        stale = [
+            document for document in page
+            if document.get("model_version") != self.service.model_version
+            and document.get("category_source") != CategorySource.USER.value
+        ]
+
+        futures = []
+        for start in range(0, len(stale), self.batch_size):
+            batch = stale[start:start + self.batch_size]
+            ai_results = self.service.process_emails_batch(
+                [(document.get("body", ""), document.get("subject", "")) for document in batch]
+            )
+            futures.extend(executor.submit(self._update_document, document, ai_result) for document, ai_result in zip(batch, ai_results))
+
+        outcomes = [future.result() for future in futures]
+        updated = outcomes.count("updated")
+        failed = outcomes.count("failed")
+        skipped = len(page) - len(stale) + outcomes.count("skipped")
+
+        with self._lock:
+            state = self._state
+            state["processed"] += len(page)
+            state["skipped"] += skipped
+            state["updated"] += updated
+            state["failed"] += failed
+            state["cursor"] = page[-1]['$id']
+            elapsed = time.monotonic() - self._run_started
+            processed_this_run = state["processed"] - self._run_start_processed
+            state["docs_per_second"] = round(processed_this_run / elapsed, 2) if elapsed > 0 else 0.0
+
+        metrics.increment("reclassification.updated", updated)
+        metrics.increment("reclassification.failed", failed)
+        metrics.increment("reclassification.skipped", skipped)
+
+    def run(self, resume: bool = True) -> Dict:
+        if not self.service.has_models:
+            # A classificação simples por palavras-chave sobrescreveria todas as classificações dos modelos
+            with self._lock:
+                self._state = self._empty_state()
+                self._state["status"] = "failed"
+                self._state["error"] = "Models are not loaded; refusing to reclassify with the keyword fallback"
+            print(f"❌ {self._state['error']}")
+            return self.status()
+
+        checkpoint = self._load_checkpoint() if resume else None
+        with self._lock:
+            self._state = self._empty_state()
+            if checkpoint and checkpoint.get("status") != "completed":
+                for key in ("cursor", "processed", "updated", "skipped", "failed"):
+                    self._state[key] = checkpoint.get(key, self._state[key])
+                print(f"⏯️ Resuming reclassification after {self._state['cursor']} ({self._state['processed']} already processed)")
+            self._state["status"] = "running"
+            self._state["started_at"] = datetime.utcnow().isoformat()
+            self._run_started = time.monotonic()
+            self._run_start_processed = self._state["processed"]
+
+        print(f"🔁 Reclassifying emails with model version {self.service.model_version}")
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="reclassify") as executor:
+                pages = appwrite_service.iter_pages(
+                    collection_id=settings.email_collection_id,
+                    page_size=self.page_size,
+                    cursor=self.status()["cursor"],
+                )
+                for page in pages:
+                    if self._cancel.is_set():
+                        with self._lock:
+                            self._state["status"] = "cancelled"
+                        break
+                    self._process_page(page, executor)
+                    self._save_checkpoint()
+
+                    state = self.status()
+                    print(f"   {state['processed']} processed | {state['updated']} updated | {state['skipped']} skipped | "
+                          f"{state['failed']} failed | {state['docs_per_second']} docs/s")
+
+            with self._lock:
+                if self._state["status"] == "running":
+                    self._state["status"] = "completed"
+        except Exception as e:
+            print(f"❌ Reclassification failed: {e}")
+            with self._lock:
+                self._state["status"] = "failed"
+                self._state["error"] = str(e)
+        finally:
+            with self._lock:
+                self._state["finished_at"] = datetime.utcnow().isoformat()
+            self._save_checkpoint()
+
+        state = self.status()
+        print(f"✅ Reclassification {state['status']}: {state['updated']} updated, {state['skipped']} skipped, "
+              f"{state['failed']} failed ({state['docs_per_second']} docs/s)")
+        return state
+
+    def start(self, resume: bool = True) -> bool:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._cancel.clear()
+            self._thread = threading.Thread(target=self.run, kwargs={"resume": resume}, name="reclassification", daemon=True)
+            self._thread.start()
+            return True
+
+    def cancel(self):
+        self._cancel.set()
+
+
+reclassification_job = ReclassificationJob(
+    email_ai_service,
+    checkpoint_path=settings.reclassify_checkpoint_path,
+    batch_size=settings.reclassify_batch_size,
+    concurrency=settings.reclassify_concurrency,
+    page_size=settings.reclassify_page_size,
+)
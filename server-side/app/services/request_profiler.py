@@ -0,0 +1,330 @@
+import cProfile
+import hmac
+import io
+import itertools
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from ..config import settings
+from .metrics import metrics
+
+PROFILE_MODE_SAMPLER = "sampler"
+PROFILE_MODE_CPROFILE = "cprofile"
+PROFILE_MODES = (PROFILE_MODE_SAMPLER, PROFILE_MODE_CPROFILE)
+
+# Threads paradas nesses pontos estão ociosas e só poluiriam o flame graph
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Amostrador estatístico: lê a pilha de todas as threads a cada interval segundos.
+
+    Ao contrário do cProfile, pega também o trabalho feito fora do event loop (chamadas ao
+    Appwrite, fila de inferência) e gera pilhas no formato "collapsed" do flamegraph.pl.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+
+class _Profile:
+    """Uma requisição perfilada: resumo para a listagem e os artefatos para download.
+
+    Nenhum dos modos isola a requisição: o sampler vê todas as threads do processo e o
+    cProfile, ligado na thread do event loop, registra toda corrotina que o loop rodou
+    entre o início e o fim dela, inclusive as de outras requisições simultâneas.
+    """
+
+    def __init__(self, profile_id: str, method: str, path: str, mode: str, trigger: str, trace_memory: bool):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.mode = mode
+        self.trigger = trigger
+        self.status_code: Optional[int] = None
+        self.started_at = datetime.utcnow().isoformat()
+        self.duration_ms = 0.0
+        self.samples: Optional[int] = None
+        self.artifacts: Dict[str, bytes] = {}
+
+        self._started = time.perf_counter()
+        self._profiler: Optional[cProfile.Profile] = None
+        self._sampler: Optional[StackSampler] = None
+        self._trace_memory = trace_memory
+        self._started_tracing = False
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._finished = False
+
+    def start(self, sampler_interval: float, memory_frames: int):
+        if self._trace_memory:
+            if tracemalloc.is_tracing():
+                # Já ligado por fora (PYTHONTRACEMALLOC): compara com o estado do início
+                self._baseline = tracemalloc.take_snapshot()
+            else:
+                tracemalloc.start(memory_frames)
+                self._started_tracing = True
+
+        if self.mode == PROFILE_MODE_CPROFILE:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = StackSampler(sampler_interval)
+            self._sampler.start()
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    def finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 2)
+
+        if self._profiler is not None:
+            self._profiler.disable()
+            stats = pstats.Stats(self._profiler)
+            self.artifacts["pstats"] = marshal.dumps(stats.stats)
+            text = io.StringIO()
+            text.write(f"Event loop profile during {self.method} {self.path}: includes every coroutine the loop ran in this window\n")
+            stats.stream = text
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(50)
+            self.artifacts["text"] = text.getvalue().encode("utf-8")
+            self._profiler = None
+        if self._sampler is not None:
+            self._sampler.stop()
+            self.artifacts["collapsed"] = self._sampler.collapsed().encode("utf-8")
+            self.samples = self._sampler.samples
+            self._sampler = None
+        if self._trace_memory:
+            self.artifacts["memory"] = self._memory_report().encode("utf-8")
+
+    def _memory_report(self, limit: int = 30) -> str:
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        if self._started_tracing:
+            tracemalloc.stop()
+        if self._baseline is not None:
+            top = snapshot.compare_to(self._baseline, "lineno")
+        else:
+            top = snapshot.statistics("lineno")
+
+        total = sum(stat.size for stat in top)
+        lines = [f"Allocations still alive at the end of {self.method} {self.path}: {total / 1024:.1f} KiB"]
+        lines.extend(str(stat) for stat in top[:limit])
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": self.status_code,
+            "mode": self.mode,
+            "trigger": self.trigger,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            # O que o artefato cobre: o event loop inteiro (cprofile) ou todas as threads (sampler)
+            "scope": "event_loop" if self.mode == PROFILE_MODE_CPROFILE else "process",
+            "formats": sorted(self.artifacts),
+        }
+
+
+class RequestProfiler:
+    """Profiling sob demanda de requisições HTTP, guardado num ring buffer em memória.
+
+    Uma fração sample_rate das requisições (opcionalmente só as que começam com
+    path_prefix) é perfilada, além de toda requisição que mande o header de debug com o
+    token de admin. Só um profile roda por vez no processo; com sample_rate 0 e sem o
+    header o custo por requisição é uma comparação.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, mode: str = PROFILE_MODE_SAMPLER, trace_memory: bool = False,
+                 buffer_size: int = 20, sampler_interval: float = 0.005, memory_frames: int = 10,
+                 header: str = "X-Debug-Profile", path_prefix: str = ""):
+        self.sampler_interval = sampler_interval
+        self.memory_frames = memory_frames
+        self.header = header.lower().encode("latin-1")
+        self._profiles: Deque[_Profile] = deque(maxlen=max(1, buffer_size))
+        self._ids = itertools.count(1)
+        self._active = False
+        self.configure(sample_rate=sample_rate, mode=mode, trace_memory=trace_memory, path_prefix=path_prefix)
+
+    def configure(self, sample_rate: Optional[float] = None, mode: Optional[str] = None,
+                  trace_memory: Optional[bool] = None, path_prefix: Optional[str] = None):
+        if mode is not None and mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        if sample_rate is not None:
+            self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        if mode is not None:
+            self.mode = mode
+        if trace_memory is not None:
+            self.trace_memory = trace_memory
+        if path_prefix is not None:
+            self.path_prefix = path_prefix
+
+    @property
+    def header_enabled(self) -> bool:
+        return bool(settings.admin_token)
+
+    def _trigger(self, scope: Dict) -> Optional[str]:
+        if self.header_enabled:
+            for name, value in scope["headers"]:
+                if name == self.header:
+                    if hmac.compare_digest(value.decode("latin-1"), settings.admin_token):
+                        return "header"
+                    break
+        if self.sample_rate and scope["path"].startswith(self.path_prefix) and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    def begin(self, scope: Dict) -> Optional[_Profile]:
+        if not self.sample_rate and not self.header_enabled:
+            return None
+        trigger = self._trigger(scope)
+        if trigger is None or "/admin/profiling" in scope["path"]:
+            return None
+        if self._active:
+            # cProfile e tracemalloc são globais: requisições concorrentes ficam de fora
+            metrics.increment("profiling.skipped_busy")
+            return None
+
+        self._active = True
+        profile = _Profile(str(next(self._ids)), scope["method"], scope["path"], self.mode, trigger, self.trace_memory)
+        try:
+            profile.start(self.sampler_interval, self.memory_frames)
+        except Exception as e:
+            self._active = False
+            print(f"⚠️ Could not start profiler: {e}")
+            return None
+        return profile
+
+    def end(self, profile: _Profile):
+        try:
+            profile.finish()
+        finally:
+            self._active = False
+        self._profiles.append(profile)
+        metrics.increment("profiling.captured")
+        metrics.observe("profiling.duration_ms", profile.duration_ms)
+        print(f"🔬 Profiled {profile.method} {profile.path} ({profile.mode}, {profile.duration_ms} ms) -> profile {profile.id}")
+
+    def get(self, profile_id: str) -> Optional[_Profile]:
+        return next((profile for profile in self._profiles if profile.id == profile_id), None)
+
+    def clear(self):
+        self._profiles.clear()
+
+    def status(self) -> Dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "mode": self.mode,
+            "trace_memory": self.trace_memory,
+            "path_prefix": self.path_prefix,
+            "header": self.header.decode("latin-1") if self.header_enabled else None,
+            "active": self._active,
+            "buffer_size": self._profiles.maxlen,
+            "profiles": [profile.summary() for profile in reversed(self._profiles)],
+        }
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI puro (sem BaseHTTPMiddleware) para não custar nada quando desligado."""
+
+    def __init__(self, app, profiler: Optional[RequestProfiler] = None):
+        self.app = app
+        self.profiler = profiler or request_profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        profile = self.profiler.begin(scope)
+        if profile is None:
+            return await self.app(scope, receive, send)
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                headers: List = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile.id.encode("latin-1")))
+                message = {**message, "headers": headers}
+                await send(message)
+                # SSE nunca termina: o profile cobre só até a abertura do stream
+                if any(name == b"content-type" and value.startswith(b"text/event-stream") for name, value in headers):
+                    self.profiler.end(profile)
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            if not profile.finished:
+                self.profiler.end(profile)
+
+
+request_profiler = RequestProfiler(
+    sample_rate=settings.profiling_sample_rate,
+    mode=settings.profiling_mode,
+    trace_memory=settings.profiling_trace_memory,
+    buffer_size=settings.profiling_buffer_size,
+    sampler_interval=settings.profiling_sampler_interval,
+    header=settings.profiling_header,
+    path_prefix=settings.profiling_path_prefix,
+)
@@ -0,0 +1,126 @@
+import os
+import resource
+import threading
+import time
+import weakref
+from typing import Dict, Optional
+
+from ..config import settings
+from .metrics import metrics
+
+
+def available_cpus() -> int:
+    """CPUs que o processo pode realmente usar (affinity e quota do cgroup, não os do host)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss é o pico (em KB no Linux), melhor que nada fora do Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ResourceGovernor:
+    """Controla threads do torch, precisão, memória e descarregamento por ociosidade dos modelos."""
+
+    def __init__(self):
+        self._threads_configured = False
+        self._model_rss: Dict[str, int] = {}
+        self._idle_thread: Optional[threading.Thread] = None
+        self._services = weakref.WeakSet()
+
+    def thread_plan(self) -> Dict[str, int]:
+        # Divide os CPUs entre os workers do uvicorn e os workers de inferência de cada processo
+        cpus = available_cpus()
+        intra = settings.torch_intra_op_threads or max(1, cpus // max(1, settings.web_concurrency * settings.inference_workers))
+        return {"cpus": cpus, "intra_op": intra, "inter_op": settings.torch_inter_op_threads}
+
+    def configure_threads(self):
+        if self._threads_configured:
+            return
+        import torch
+
+        plan = self.thread_plan()
+        torch.set_num_threads(plan["intra_op"])
+        try:
+            torch.set_num_interop_threads(plan["inter_op"])
+        except RuntimeError:
+            # Só pode ser definido antes do primeiro trabalho paralelo do torch
+            pass
+        self._threads_configured = True
+        metrics.set_gauge("torch.intra_op_threads", torch.get_num_threads())
+        metrics.set_gauge("torch.inter_op_threads", torch.get_num_interop_threads())
+        print(f"🧵 Torch threads: intra-op {torch.get_num_threads()}, inter-op {torch.get_num_interop_threads()} ({plan['cpus']} CPUs)")
+
+    def apply_precision(self, module):
+        if settings.inference_precision != "int8":
+            return module
+        import torch
+
+        return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def load_model(self, name: str, loader):
+        """Carrega um modelo medindo o RSS que ele acrescenta ao processo."""
+        before = current_rss_bytes()
+        model = loader()
+        self._model_rss[name] = max(0, current_rss_bytes() - before)
+        metrics.set_gauge(f"models.rss_bytes.{name}", self._model_rss[name])
+        print(f"📦 Model {name} loaded (+{self._model_rss[name] / 1024 / 1024:.0f} MB RSS)")
+        return model
+
+    def forget_model(self, name: str):
+        self._model_rss.pop(name, None)
+        metrics.set_gauge(f"models.rss_bytes.{name}", 0)
+
+    def over_budget(self) -> bool:
+        budget = settings.inference_memory_budget_mb * 1024 * 1024
+        return budget > 0 and sum(self._model_rss.values()) > budget
+
+    def report(self) -> Dict:
+        rss = current_rss_bytes()
+        metrics.set_gauge("process.rss_bytes", rss)
+        return {
+            "process_rss_bytes": rss,
+            "model_rss_bytes": dict(self._model_rss),
+            "memory_budget_bytes": settings.inference_memory_budget_mb * 1024 * 1024,
+            "threads": self.thread_plan(),
+            "precision": settings.inference_precision,
+            "idle_timeout": settings.inference_idle_timeout,
+        }
+
+    def start_idle_watcher(self, service):
+        if settings.inference_idle_timeout <= 0:
+            return
+        self._services.add(service)
+        if self._idle_thread is not None:
+            return
+
+        def _run():
+            interval = max(1.0, settings.inference_idle_timeout / 4)
+            while True:
+                time.sleep(interval)
+                for watched in list(self._services):
+                    if watched.models_loaded and watched.idle_seconds() >= settings.inference_idle_timeout:
+                        if watched.unload_models():
+                            print(f"💤 Models unloaded after {settings.inference_idle_timeout:.0f}s idle")
+
+        self._idle_thread = threading.Thread(target=_run, name="model-idle-watcher", daemon=True)
+        self._idle_thread.start()
+
+
+resource_governor = ResourceGovernor()
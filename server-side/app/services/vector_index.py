@@ -0,0 +1,486 @@
+import asyncio
+import io
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from ..config import settings
+from .metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos (desenvolvimento com um worker)
+    fcntl = None
+
+_INT8_SCALE = 127.0
+# Cabeçalho do diário (marca + geração da base) e prefixo de tamanho de cada registro
+_JOURNAL_HEADER = struct.Struct("<4sQ")
+_JOURNAL_MAGIC = b"VIJ1"
+_RECORD_PREFIX = struct.Struct("<Q")
+# Abaixo disso o diário nunca é compactado, para não regravar a base a cada poucos saves
+_JOURNAL_MIN_COMPACT_BYTES = 4 * 1024 * 1024
+
+
+class VectorIndex:
+    """Índice local de embeddings dos emails, particionado por usuário (remetente/destinatário).
+
+    Os vetores ficam numa matriz contígua (float32, ou int8 quando a coleção passa de
+    quantize_threshold) e cada usuário tem a lista das linhas do seu mailbox, então uma
+    busca só multiplica os vetores daquele mailbox, independente do total de vetores.
+
+    Vários workers compartilham o mesmo arquivo. Em disco ficam uma base (.npz) e um diário
+    ao lado dela (.journal) só com as mudanças posteriores. Cada save, com o arquivo travado,
+    lê do diário apenas o que os outros workers acrescentaram desde o seu último save e
+    acrescenta as suas próprias mudanças, então o custo de um save é proporcional ao número
+    de mudanças, não ao tamanho do índice. Quando o diário fica maior que a base, quem está
+    salvando regrava a base com o estado completo e zera o diário (nova geração); os outros
+    workers percebem a troca de geração e recarregam a base inteira uma única vez.
+    """
+
+    def __init__(self, path: str, quantize_threshold: int = 200_000, backfill_limit: int = 10_000):
+        self.path = path
+        self.quantize_threshold = quantize_threshold
+        self.backfill_limit = backfill_limit
+
+        self._lock = threading.RLock()
+        self._vectors: Optional[np.ndarray] = None
+        self._size = 0
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._owners: List[Tuple[str, ...]] = []
+        self._owner_rows: Dict[str, Set[int]] = defaultdict(set)
+        # doc_id -> (vetor, donos) ou None para remoção, ainda não gravados no arquivo
+        self._pending: Dict[str, Optional[Tuple[np.ndarray, Tuple[str, ...]]]] = {}
+        # Geração da base e posição no diário já aplicadas na memória (None: nunca carregado)
+        self._generation: Optional[int] = None
+        self._journal_offset = _JOURNAL_HEADER.size
+        self._synced_state: Optional[Tuple] = None
+        # Emails classificados sem embedding (cascata): doc_id -> (texto, donos)
+        self._backfill: "OrderedDict[str, Tuple[str, Tuple[str, ...]]]" = OrderedDict()
+        self._autosave_thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def quantized(self) -> bool:
+        return self._vectors is not None and self._vectors.dtype == np.int8
+
+    def _normalize(self, vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def _store(self, vector: np.ndarray) -> np.ndarray:
+        if self.quantized:
+            return np.clip(np.round(vector * _INT8_SCALE), -127, 127).astype(np.int8)
+        return vector
+
+    def _load_rows(self, rows: np.ndarray) -> np.ndarray:
+        vectors = self._vectors[rows]
+        if self.quantized:
+            return vectors.astype(np.float32) / _INT8_SCALE
+        return vectors
+
+    def _ensure_capacity(self, dim: int):
+        if self._vectors is None:
+            self._vectors = np.zeros((1024, dim), dtype=np.float32)
+        elif self._vectors.shape[1] != dim:
+            raise ValueError(f"Embedding dimension mismatch: expected {self._vectors.shape[1]}, got {dim}")
+
+        if self._size == len(self._vectors):
+            grown = np.zeros((len(self._vectors) * 2, dim), dtype=self._vectors.dtype)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+
+        if not self.quantized and self._size >= self.quantize_threshold:
+            print(f"🗜️ Vector index reached {self._size} vectors, switching to int8 storage")
+            self._vectors = np.clip(np.round(self._vectors * _INT8_SCALE), -127, 127).astype(np.int8)
+
+    def upsert(self, doc_id: str, vector: np.ndarray, owners: Iterable[str]):
+        vector = self._normalize(vector)
+        owners = tuple(owner for owner in dict.fromkeys(owners) if owner)
+
+        with self._lock:
+            self._set_row(doc_id, vector, owners)
+            self._pending[doc_id] = (vector, owners)
+
+    def _set_row(self, doc_id: str, vector: np.ndarray, owners: Tuple[str, ...]):
+        row = self._rows.get(doc_id)
+        if row is None:
+            self._ensure_capacity(vector.shape[0])
+            row = self._size
+            self._size += 1
+            self._ids.append(doc_id)
+            self._owners.append(())
+            self._rows[doc_id] = row
+
+        for owner in self._owners[row]:
+            self._owner_rows[owner].discard(row)
+        for owner in owners:
+            self._owner_rows[owner].add(row)
+
+        self._vectors[row] = self._store(vector)
+        self._owners[row] = owners
+
+    def index_document(self, document: Dict, embedding: Optional[np.ndarray]):
+        if not settings.vector_index_enabled:
+            return
+        owners = (document.get('sender_user_id'), document.get('recipient_user_id'))
+        if embedding is not None:
+            with self._lock:
+                self._backfill.pop(document['$id'], None)
+            self.upsert(document['$id'], embedding, owners)
+            return
+
+        # Aceito pela cascata sem passar pelo MiniLM: o embedding é calculado depois, na faixa de lote
+        text = f"{document.get('subject') or ''} {document.get('body') or ''}".strip()
+        if not text:
+            return
+        with self._lock:
+            self._backfill[document['$id']] = (text, owners)
+            self._backfill.move_to_end(document['$id'])
+            while len(self._backfill) > self.backfill_limit:
+                self._backfill.popitem(last=False)
+                metrics.increment("vector_index.backfill_dropped")
+            metrics.set_gauge("vector_index.backfill_pending", len(self._backfill))
+
+    def remove(self, doc_id: str) -> bool:
+        with self._lock:
+            self._backfill.pop(doc_id, None)
+            self._pending[doc_id] = None
+            return self._drop_row(doc_id)
+
+    def _drop_row(self, doc_id: str) -> bool:
+        row = self._rows.pop(doc_id, None)
+        if row is None:
+            return False
+
+        for owner in self._owners[row]:
+            self._owner_rows[owner].discard(row)
+
+        # Move a última linha para o buraco, mantendo a matriz contígua
+        last = self._size - 1
+        if row != last:
+            moved_id = self._ids[last]
+            self._vectors[row] = self._vectors[last]
+            self._ids[row] = moved_id
+            self._owners[row] = self._owners[last]
+            self._rows[moved_id] = row
+            for owner in self._owners[row]:
+                self._owner_rows[owner].discard(last)
+                self._owner_rows[owner].add(row)
+
+        self._ids.pop()
+        self._owners.pop()
+        self._size = last
+        return True
+
+    def get_vector(self, doc_id: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._rows.get(doc_id)
+            if row is None:
+                return None
+            return self._load_rows(np.array([row]))[0]
+
+    def search(self, query: np.ndarray, owner: str, limit: int = 10, exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        query = self._normalize(query)
+
+        with self._lock:
+            rows = self._owner_rows.get(owner)
+            if not rows:
+                return []
+            rows = np.fromiter(rows, dtype=np.int64, count=len(rows))
+            scores = self._load_rows(rows) @ query
+            ids = [self._ids[row] for row in rows]
+
+        k = min(limit + 1, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = [(ids[i], float(scores[i])) for i in top if ids[i] != exclude]
+        return results[:limit]
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a+") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _replay(self, changes: Dict[str, Optional[Tuple[np.ndarray, Tuple[str, ...]]]]):
+        """Aplica mudanças já gravadas (ou a regravar) sem marcá-las como pendentes."""
+        for doc_id, entry in changes.items():
+            if entry is None:
+                self._drop_row(doc_id)
+            else:
+                self._set_row(doc_id, *entry)
+
+    def _adopt(self, other: "VectorIndex"):
+        self._vectors = other._vectors
+        self._size = other._size
+        self._ids = other._ids
+        self._rows = other._rows
+        self._owners = other._owners
+        self._owner_rows = other._owner_rows
+        self._generation = other._generation
+        self._journal_offset = other._journal_offset
+        self._synced_state = other._synced_state
+
+    @property
+    def journal_path(self) -> str:
+        return f"{self.path}.journal"
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def _disk_state(self) -> Tuple:
+        try:
+            journal_size = os.path.getsize(self.journal_path)
+        except OSError:
+            journal_size = None
+        return self._file_mtime(), journal_size
+
+    def _disk_generation(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        with np.load(self.path) as data:
+            return int(data["generation"]) if "generation" in data.files else 0
+
+    def save(self):
+        """Grava as mudanças locais no diário compartilhado e aplica as dos outros workers."""
+        with self._lock:
+            if not self._pending and self._generation is not None and self._disk_state() == self._synced_state:
+                return
+            pending, self._pending = self._pending, {}
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        reloaded = None
+        try:
+            with self._file_lock():
+                generation = self._disk_generation()
+                if generation != self._generation:
+                    # Base regravada por outro worker (ou nunca carregada): recarrega tudo uma vez
+                    reloaded = VectorIndex(self.path, quantize_threshold=self.quantize_threshold)
+                    reloaded._read()
+                    changes, offset = {}, reloaded._journal_offset
+                else:
+                    changes, offset = self._read_journal(generation, self._journal_offset)
+                if pending:
+                    offset = self._append_journal(generation, pending, offset)
+
+                target = reloaded or self
+                with self._lock:
+                    target._replay(changes)
+                    target._replay(pending)
+                    if target is self:
+                        # Mudanças feitas durante o save continuam pendentes para o próximo
+                        self._replay(self._pending)
+                    target._journal_offset = offset
+                    target._synced_state = self._disk_state()
+
+                if reloaded is None and self._journal_outgrew_base():
+                    self._compact(generation + 1)
+        except Exception:
+            with self._lock:
+                # Devolve as mudanças para o próximo save sem passar por cima das mais novas
+                self._pending = {**pending, **self._pending}
+            raise
+
+        if reloaded is not None:
+            with self._lock:
+                newer = self._pending
+                self._adopt(reloaded)
+                self._replay(newer)
+        if pending:
+            print(f"💾 Vector index saved: {len(pending)} changes, {self._size} vectors -> {self.journal_path}")
+
+    def _journal_outgrew_base(self) -> bool:
+        try:
+            journal_size = os.path.getsize(self.journal_path)
+        except OSError:
+            return False
+        base_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return journal_size > max(base_size, _JOURNAL_MIN_COMPACT_BYTES)
+
+    def _compact(self, generation: int):
+        """Regrava a base com o estado completo e começa um diário vazio da nova geração."""
+        with self._lock:
+            # Inclui mudanças ainda pendentes: elas voltam ao diário no próximo save, o que é idempotente
+            vectors = self._vectors[:self._size].copy() if self._vectors is not None else np.zeros((0, 0), np.float32)
+            ids, owners = list(self._ids), list(self._owners)
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, vectors=vectors, ids=np.array(ids, dtype=str),
+                 owners=np.array(["\t".join(owner) for owner in owners], dtype=str),
+                 generation=np.array(generation))
+        os.replace(tmp_path, self.path)
+        # Se o processo cair aqui, o diário antigo tem outra geração e é ignorado na leitura
+        self._append_journal(generation, {}, _JOURNAL_HEADER.size)
+
+        with self._lock:
+            self._generation = generation
+            self._journal_offset = _JOURNAL_HEADER.size
+            self._synced_state = self._disk_state()
+        print(f"🗜️ Vector index compacted: {len(ids)} vectors -> {self.path}")
+
+    @staticmethod
+    def _encode(changes: Dict[str, Optional[Tuple[np.ndarray, Tuple[str, ...]]]]) -> bytes:
+        upserts = [(doc_id, entry) for doc_id, entry in changes.items() if entry is not None]
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            ids=np.array([doc_id for doc_id, _ in upserts], dtype=str),
+            vectors=np.stack([entry[0] for _, entry in upserts]) if upserts else np.zeros((0, 0), np.float32),
+            owners=np.array(["\t".join(entry[1]) for _, entry in upserts], dtype=str),
+            removed=np.array([doc_id for doc_id, entry in changes.items() if entry is None], dtype=str),
+        )
+        return buffer.getvalue()
+
+    @staticmethod
+    def _decode(payload: bytes) -> Dict[str, Optional[Tuple[np.ndarray, Tuple[str, ...]]]]:
+        with np.load(io.BytesIO(payload)) as data:
+            changes: Dict[str, Optional[Tuple[np.ndarray, Tuple[str, ...]]]] = {doc_id: None for doc_id in data["removed"].tolist()}
+            for doc_id, vector, owner in zip(data["ids"].tolist(), data["vectors"], data["owners"].tolist()):
+                changes[doc_id] = (vector, tuple(owner.split("\t")) if owner else ())
+        return changes
+
+    def _read_journal(self, generation: int, offset: int) -> Tuple[Dict, int]:
+        """Lê os registros completos a partir de offset; devolve as mudanças e onde elas terminam."""
+        try:
+            handle = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return {}, _JOURNAL_HEADER.size
+
+        changes: Dict[str, Optional[Tuple[np.ndarray, Tuple[str, ...]]]] = {}
+        with handle:
+            header = handle.read(_JOURNAL_HEADER.size)
+            if len(header) < _JOURNAL_HEADER.size or _JOURNAL_HEADER.unpack(header) != (_JOURNAL_MAGIC, generation):
+                # Diário de outra geração (compactação interrompida): o conteúdo já está na base
+                return changes, _JOURNAL_HEADER.size
+
+            position = max(offset, _JOURNAL_HEADER.size)
+            handle.seek(position)
+            while True:
+                prefix = handle.read(_RECORD_PREFIX.size)
+                if len(prefix) < _RECORD_PREFIX.size:
+                    break
+                (length,) = _RECORD_PREFIX.unpack(prefix)
+                payload = handle.read(length)
+                if len(payload) < length:
+                    # Registro incompleto de um worker que caiu no meio da escrita: o próximo append sobrescreve
+                    break
+                changes.update(self._decode(payload))
+                position = handle.tell()
+        return changes, position
+
+    def _append_journal(self, generation: int, changes: Dict, offset: int) -> int:
+        with open(os.open(self.journal_path, os.O_RDWR | os.O_CREAT), "r+b") as handle:
+            header = handle.read(_JOURNAL_HEADER.size)
+            if len(header) < _JOURNAL_HEADER.size or _JOURNAL_HEADER.unpack(header) != (_JOURNAL_MAGIC, generation):
+                handle.seek(0)
+                handle.write(_JOURNAL_HEADER.pack(_JOURNAL_MAGIC, generation))
+                offset = _JOURNAL_HEADER.size
+            handle.truncate(offset)
+            handle.seek(offset)
+            if changes:
+                payload = self._encode(changes)
+                handle.write(_RECORD_PREFIX.pack(len(payload)) + payload)
+            return handle.tell()
+
+    def _read(self):
+        generation = 0
+        if os.path.exists(self.path):
+            with np.load(self.path) as data:
+                vectors, ids, owners = data["vectors"], data["ids"].tolist(), data["owners"].tolist()
+                generation = int(data["generation"]) if "generation" in data.files else 0
+
+            with self._lock:
+                self._vectors = vectors if len(vectors) else None
+                self._size = len(ids)
+                self._ids = ids
+                self._rows = {doc_id: row for row, doc_id in enumerate(ids)}
+                self._owners = [tuple(owner.split("\t")) if owner else () for owner in owners]
+                self._owner_rows = defaultdict(set)
+                for row, row_owners in enumerate(self._owners):
+                    for owner in row_owners:
+                        self._owner_rows[owner].add(row)
+
+        changes, offset = self._read_journal(generation, _JOURNAL_HEADER.size)
+        with self._lock:
+            self._replay(changes)
+            self._generation = generation
+            self._journal_offset = offset
+            self._synced_state = self._disk_state()
+
+    def load(self):
+        if not os.path.exists(self.path) and not os.path.exists(self.journal_path):
+            return
+        self._read()
+        print(f"📂 Vector index loaded: {self._size} vectors from {self.path}")
+
+    async def run_backfill(self, embed: Callable[[str], Awaitable[Optional[np.ndarray]]], idle_interval: float = 1.0):
+        """Calcula os embeddings que a cascata pulou, um por vez, enquanto a API estiver de pé."""
+        while True:
+            with self._lock:
+                entry = next(iter(self._backfill.items()), None)
+            if entry is None:
+                await asyncio.sleep(idle_interval)
+                continue
+
+            doc_id, (text, owners) = entry
+            try:
+                vector = await embed(text)
+            except Exception as e:
+                print(f"❌ Error embedding email {doc_id} for the vector index: {e}")
+                vector = None
+
+            with self._lock:
+                # Apagado ou reindexado com embedding enquanto o vetor era calculado: descarta
+                if self._backfill.pop(doc_id, None) is None:
+                    continue
+                metrics.set_gauge("vector_index.backfill_pending", len(self._backfill))
+                if vector is None:
+                    metrics.increment("vector_index.backfill_failed")
+                    continue
+                self.upsert(doc_id, vector, owners)
+            metrics.increment("vector_index.backfilled")
+
+    def start_autosave(self, interval: float):
+        if self._autosave_thread is not None or interval <= 0:
+            return
+
+        def _run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.save()
+                except Exception as e:
+                    print(f"❌ Error saving vector index: {e}")
+
+        self._autosave_thread = threading.Thread(target=_run, name="vector-index-autosave", daemon=True)
+        self._autosave_thread.start()
+
+
+vector_index = VectorIndex(settings.vector_index_path, quantize_threshold=settings.vector_index_quantize_threshold)
+if settings.vector_index_enabled:
+    try:
+        vector_index.load()
+    except Exception as e:
+        print(f"❌ Error loading vector index: {e}")
@@ -0,0 +1,36 @@
+# server-side/import_mailbox.py
+import argparse
+import asyncio
+
+from app.config import settings
+from app.services.appwrite_user_service import appwrite_user_service
+from app.services.email_ai_service import EmailAIService, email_ai_service
+from app.services.mailbox_import_service import MailboxImportJob
+from app.services.vector_index import vector_index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa um mbox ou zip de .eml para a caixa de entrada de um usuário")
+    parser.add_argument("path", help="Arquivo mbox ou zip com arquivos .eml")
+    parser.add_argument("--user-id", required=True, help="Usuário dono da caixa de entrada")
+    parser.add_argument("--batch-size", type=int, default=settings.import_batch_size)
+    parser.add_argument("--concurrency", type=int, default=settings.import_concurrency)
+    args = parser.parse_args()
+
+    user = appwrite_user_service.get_user(args.user_id)
+    # Sempre usa os modelos neste processo, mesmo com INFERENCE_BACKEND=sidecar
+    service = email_ai_service if email_ai_service.has_models else EmailAIService()
+    job = MailboxImportJob(
+        service,
+        args.path,
+        user_id=args.user_id,
+        recipient_email=user.get("email", ""),
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+    )
+    try:
+        state = asyncio.run(job.run())
+    finally:
+        if settings.vector_index_enabled:
+            vector_index.save()
+
+    raise SystemExit(0 if state["status"] == "completed" else 1)
@@ -0,0 +1,36 @@
+# server-side/reclassify.py
+import argparse
+
+from app.config import settings
+from app.services.email_ai_service import EmailAIService, email_ai_service
+from app.services.reclassification_service import ReclassificationJob
+from app.services.vector_index import vector_index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reclassifica todos os emails com a versão atual dos modelos")
+    parser.add_argument("--no-resume", action="store_true", help="Ignora o checkpoint e recomeça do início")
+    parser.add_argument("--batch-size", type=int, default=settings.reclassify_batch_size)
+    parser.add_argument("--concurrency", type=int, default=settings.reclassify_concurrency)
+    parser.add_argument("--page-size", type=int, default=settings.reclassify_page_size)
+    args = parser.parse_args()
+
+    # Sempre usa os modelos neste processo, mesmo com INFERENCE_BACKEND=sidecar
+    service = email_ai_service if email_ai_service.has_models else EmailAIService()
+    if not service.has_models:
+        print("❌ Models could not be loaded; not reclassifying with the keyword fallback")
+        raise SystemExit(2)
+
+    job = ReclassificationJob(
+        service,
+        checkpoint_path=settings.reclassify_checkpoint_path,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        page_size=args.page_size,
+    )
+    try:
+        state = job.run(resume=not args.no_resume)
+    finally:
+        if settings.vector_index_enabled:
+            vector_index.save()
+
+    raise SystemExit(0 if state["status"] == "completed" else 1)
@@ -0,0 +1,6 @@
+# server-side/run_inference.py
+from app.services.inference_server import main
+
+if __name__ == "__main__":
+    # Sidecar de inferência: use INFERENCE_BACKEND=sidecar na API para consumi-lo
+    main()
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# Settings exigem as variáveis do Appwrite; os testes nunca falam com ele
+for name, value in {
+    "APPWRITE_ENDPOINT": "http://localhost:1/v1",
+    "APPWRITE_PROJECT": "test",
+    "APPWRITE_KEY": "test",
+    "APPWRITE_DATABASE_ID": "test",
+    "EMAIL_COLLECTION_ID": "emails",
+    "INFERENCE_BACKEND": "sidecar",
+}.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.appwrite_resilience import (
+    BREAKER_CLOSED, BREAKER_HALF_OPEN, AppwriteTimeoutError, CircuitBreaker, ResilientCaller,
+)
+
+
+def _caller(breaker: CircuitBreaker) -> ResilientCaller:
+    return ResilientCaller(read_timeout=5, write_timeout=5, read_retries=0, backoff_base=0,
+                           backoff_max=0, hedge_delay=0, breaker=breaker, max_workers=4)
+
+
+def _fail():
+    raise AppwriteTimeoutError("get_document", 0.1)
+
+
+def test_cancelled_half_open_probe_releases_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    caller = _caller(breaker)
+    release = threading.Event()
+
+    async def scenario():
+        with pytest.raises(AppwriteTimeoutError):
+            await caller.call_async("get_document", _fail, idempotent=True)
+
+        # A sonda do half-open é cancelada antes de o Appwrite responder
+        probe = asyncio.create_task(caller.call_async("get_document", release.wait, idempotent=True))
+        await asyncio.sleep(0.05)
+        assert breaker.state == BREAKER_HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        release.set()
+
+        return await caller.call_async("get_document", lambda: "ok", idempotent=True)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert breaker.state == BREAKER_CLOSED
@@ -0,0 +1,77 @@
+import asyncio
+import hashlib
+
+import numpy as np
+
+from app.config import settings
+from app.services.email_ai_service import SIMPLE_MODEL_VERSION, EmailAIService
+from app.services.near_duplicate_service import near_duplicate_index
+from app.services.vector_index import VectorIndex
+
+
+class _BagOfWordsEncoder:
+    """Substitui o MiniLM: vetor determinístico que muda com qualquer palavra do texto."""
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), 64), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+        return vectors
+
+
+def _service() -> EmailAIService:
+    service = EmailAIService(load_models=False)
+    service.embedding_model = _BagOfWordsEncoder()
+    service.classifier = lambda text: [{"label": "neutral", "score": 0.5}]
+    service.productive_embeddings = service.embedding_model.encode(["preciso de ajuda com um problema urgente"])
+    service.unproductive_embeddings = service.embedding_model.encode(["feliz natal e próspero ano novo"])
+    return service
+
+
+def test_near_duplicate_reuse_indexes_the_email_own_vector(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "near_duplicate_enabled", True)
+    monkeypatch.setattr(settings, "cascade_enabled", False)
+    monkeypatch.setattr(settings, "vector_index_enabled", True)
+    near_duplicate_index.clear()
+    service = _service()
+
+    words = " ".join(f"palavra{index}" for index in range(40))
+    first = service.process_email_sync(f"{words} relatório", "Status do projeto")
+    second = service.process_email_sync(f"{words} planilha", "Status do projeto")
+
+    # O segundo reaproveita a classificação do primeiro, mas não o vetor
+    assert second["category"] == first["category"]
+    assert second["embedding"] is None
+    assert second["model_version"] == first["model_version"]
+
+    index = VectorIndex(str(tmp_path / "index.npz"))
+    index.index_document({"$id": "a", "subject": "Status do projeto", "body": f"{words} relatório", "recipient_user_id": "u"}, first["embedding"])
+    index.index_document({"$id": "b", "subject": "Status do projeto", "body": f"{words} planilha", "recipient_user_id": "u"}, second["embedding"])
+
+    async def backfill():
+        async def embed(text):
+            return service.embed_text_sync(text)
+        task = asyncio.create_task(index.run_backfill(embed, idle_interval=0.01))
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(backfill())
+    first_vector, second_vector = index.get_vector("a"), index.get_vector("b")
+    assert second_vector is not None
+    assert not np.allclose(first_vector, second_vector)
+
+
+def test_cascade_audit_keeps_the_embedding_it_computed(monkeypatch):
+    monkeypatch.setattr(settings, "near_duplicate_enabled", False)
+    monkeypatch.setattr(settings, "cascade_enabled", True)
+    monkeypatch.setattr(settings, "cascade_audit_rate", 1.0)
+    service = _service()
+    monkeypatch.setattr(service, "_keyword_scores", lambda content, subject: (5, 0))
+    monkeypatch.setattr(service, "classify_email_simple", lambda content, subject: ("Produtivo", 0.95, "ok"))
+
+    result = service.process_email_sync("preciso de ajuda com o relatório", "Urgente")
+
+    # A auditoria já pagou pelo embedding: ele segue com o resultado em vez de ir para o backfill
+    assert result["embedding"] is not None
+    assert result["model_version"] == SIMPLE_MODEL_VERSION
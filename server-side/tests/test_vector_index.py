@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+from app.services import vector_index as vector_index_module
+from app.services.vector_index import VectorIndex
+
+
+def _vector(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=16).astype(np.float32)
+
+
+def test_workers_share_changes_through_the_journal(tmp_path):
+    path = str(tmp_path / "index.npz")
+    first, second = VectorIndex(path), VectorIndex(path)
+    first.load()
+    second.load()
+
+    first.upsert("a", _vector(1), ["u1"])
+    first.save()
+    second.upsert("b", _vector(2), ["u2"])
+    second.save()
+    first.save()
+
+    # Só o diário cresce: a base não é regravada a cada save
+    assert not os.path.exists(path)
+    assert first.get_vector("b") is not None and second.get_vector("a") is not None
+
+    second.remove("a")
+    second.save()
+    first.save()
+    assert first.get_vector("a") is None
+
+    # Sem mudanças de ninguém, o save não toca nos arquivos
+    journal_mtime = os.path.getmtime(first.journal_path)
+    first.save()
+    assert os.path.getmtime(first.journal_path) == journal_mtime
+
+    restarted = VectorIndex(path)
+    restarted.load()
+    assert len(restarted) == 1 and restarted.get_vector("b") is not None
+
+
+def test_compaction_rewrites_the_base_and_other_workers_reload(tmp_path, monkeypatch):
+    path = str(tmp_path / "index.npz")
+    first, second = VectorIndex(path), VectorIndex(path)
+    first.upsert("a", _vector(1), ["u1"])
+    first.save()
+    second.save()
+
+    monkeypatch.setattr(vector_index_module, "_JOURNAL_MIN_COMPACT_BYTES", 0)
+    second.upsert("b", _vector(2), ["u1"])
+    second.save()
+    assert os.path.exists(path)
+    assert os.path.getsize(second.journal_path) == vector_index_module._JOURNAL_HEADER.size
+
+    first.upsert("c", _vector(3), ["u1"])
+    first.save()
+    assert {doc_id for doc_id, _ in first.search(_vector(2), "u1")} == {"a", "b", "c"}
+
+    second.save()
+    assert {doc_id for doc_id, _ in second.search(_vector(3), "u1")} == {"a", "b", "c"}
@@ -0,0 +1,22 @@
+# server-side/train_classifier_head.py
+import argparse
+
+from app.config import settings
+from app.services.classifier_head_trainer import train_classifier_head
+from app.services.email_ai_service import EmailAIService, email_ai_service
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Treina a cabeça de classificação sobre os embeddings MiniLM dos emails salvos")
+    parser.add_argument("--output", default=settings.classifier_head_path)
+    parser.add_argument("--correction-weight", type=float, default=settings.classifier_correction_weight)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # Processos da API recarregam o arquivo sozinhos (CLASSIFIER_HEAD_RELOAD_INTERVAL)
+    service = email_ai_service if email_ai_service.has_models else EmailAIService()
+    train_classifier_head(
+        service,
+        output_path=args.output,
+        correction_weight=args.correction_weight,
+        holdout=args.holdout,
+    )